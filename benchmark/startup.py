@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+usage: startup.py [options]
+
+Measure the startup time of git-doctor; i.e. the time until any examination begins. Meant to catch
+regressions (e.g. a module imported up front that could be imported on use), as startup time adds
+to every invocation; for example, when examining staged changes in a pre-commit hook.
+
+Each invocation is run a number of times in a small repository, and the median wall time is
+reported along with the time spent starting the interpreter itself. Imports are then measured
+using `python -X importtime`, and the slowest ones reported.
+
+Run it from the root of the project using `python benchmark/startup.py`.
+
+OPTIONS
+  --runs=<count>      Number of times to run each invocation [default: 20]
+  --imports=<count>   Number of slowest imports to report [default: 10]
+  --limit=<ms>        Exit with non-zero status if any invocation takes longer than this
+                      (not counting interpreter startup)
+  -h --help           Show program help
+"""
+
+import os
+import re
+import sys
+import time
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# measure the package of this working tree, not any installed version
+sys.path.insert(0, ROOT)
+
+from doctor.arguments import parse_or_exit, Usage, VALUE  # noqa: E402
+
+OPTIONS = {
+    '--runs': VALUE,
+    '--imports': VALUE,
+    '--limit': VALUE
+}
+
+USAGES = [
+    Usage(None, ('--runs', '--imports', '--limit'))
+]
+
+# invocations that should start fast; each runs as `python -m doctor <arguments>`
+INVOCATIONS = [
+    ['--version'],
+    ['--staged'],
+    ['--staged', '--budget=5']
+]
+
+# the pattern of a line reported by `-X importtime`; e.g. 'import time:  1234 |  5678 |   re'
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|'
+                                 r'(?P<indentation>\s+)(?P<module>\S+)')
+
+GIT_ENVIRONMENT = {
+    'GIT_AUTHOR_NAME': 'benchmark', 'GIT_AUTHOR_EMAIL': 'benchmark@localhost',
+    'GIT_COMMITTER_NAME': 'benchmark', 'GIT_COMMITTER_EMAIL': 'benchmark@localhost'
+}
+
+
+def create_repository(path: str):
+    """ Create a small repository with a commit and a staged change. """
+
+    env = dict(os.environ, **GIT_ENVIRONMENT)
+
+    def git(*args):
+        subprocess.run(['git', *args], cwd=path, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    git('init')
+
+    with open(os.path.join(path, 'README.md'), 'w') as file:
+        file.write('benchmark\n')
+
+    git('add', 'README.md')
+    git('commit', '-m', 'initial commit')
+
+    with open(os.path.join(path, 'README.md'), 'a') as file:
+        file.write('staged\n')
+
+    git('add', 'README.md')
+
+
+def time_invocation(argv: list, path: str, runs: int) -> float:
+    """ Return the median time (in seconds) that a command takes to run in a path. """
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+
+    timings = []
+
+    for _ in range(runs):
+        started = time.perf_counter()
+
+        subprocess.run(argv, cwd=path, env=env, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+
+        timings.append(time.perf_counter() - started)
+
+    return statistics.median(timings)
+
+
+def find_slowest_imports(argv: list, path: str, count: int) -> list:
+    """ Return a list of the slowest top-level imports of a command (by cumulative time), along
+    with their time (in seconds).
+    """
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + argv[1:], cwd=path, env=env,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE)
+
+    imports = []
+
+    for line in result.stderr.decode('utf-8').splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+
+        # only include imports made directly (i.e. not imported by another module)
+        if match is None or len(match.group('indentation')) != 1:
+            continue
+
+        imports.append((match.group('module'), int(match.group('cumulative')) / 1000000))
+
+    return sorted(imports, key=lambda entry: entry[1], reverse=True)[:count]
+
+
+def main():
+    """ Entry point for running the startup benchmark. """
+
+    args = parse_or_exit(__doc__, sys.argv[1:], options=OPTIONS, usages=USAGES,
+                         defaults={'--runs': '20', '--imports': '10'})
+
+    runs = int(args['--runs'])
+    limit = float(args['--limit']) / 1000 if args['--limit'] is not None else None
+
+    is_exceeded = False
+
+    with tempfile.TemporaryDirectory() as path:
+        create_repository(path)
+
+        baseline = time_invocation([sys.executable, '-c', 'pass'], path, runs)
+
+        print(f'{"interpreter startup":<32} {baseline * 1000:8.1f}ms')
+
+        for arguments in INVOCATIONS:
+            argv = [sys.executable, '-m', 'doctor'] + arguments
+
+            timing = time_invocation(argv, path, runs) - baseline
+
+            print(f'{" ".join(["git doctor"] + arguments):<32} {timing * 1000:8.1f}ms')
+
+            if limit is not None and timing > limit:
+                is_exceeded = True
+
+        print()
+        print('slowest imports of `git doctor --staged`:')
+
+        for module, timing in find_slowest_imports([sys.executable, '-m', 'doctor', '--staged'],
+                                                   path, int(args['--imports'])):
+            print(f'  {module:<30} {timing * 1000:8.1f}ms')
+
+    if is_exceeded:
+        sys.exit(f'startup took longer than {args["--limit"]}ms')
+
+
+if __name__ == '__main__':
+    main()
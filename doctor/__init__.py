@@ -22,6 +22,22 @@ def exit_if_not_compatible():
         sys.exit('Python 3.6+ required')
 
 
+def checkup(path: str, checks: list=None, **options) -> list:
+    """ Examine the repository found at a path and return a list of outcomes; one per examination.
+
+    This is the entry point for using git-doctor as a library. Nothing is emitted, and the current
+    working directory is not used; so any number of repositories can be examined by one process.
+
+    See doctor.diagnose.checkup for details on any other options.
+    """
+
+    # imported on use; this package is also imported by setup.py, which must not depend on
+    # anything but the standard library
+    from doctor.diagnose import checkup as examine
+
+    return examine(path, checks, **options)
+
+
 def is_windows_environment() -> bool:
     """ Return True if on a Windows platform, False otherwise. """
 
@@ -2,45 +2,153 @@
 # coding=utf-8
 
 """
-usage: git doctor [--verbose]
-       git doctor scrub [--verbose] [--aggressive]
+usage: git doctor scrub [--verbose] [--aggressive | --optimize] [--threads=<count>]
+                        [--window-memory=<size>] [--max-pack-size=<size>] [--nice]
+       git doctor serve [--socket=<path>]
+       git doctor --staged [--verbose] [--budget=<seconds>] [--max-size=<size>]
+       git doctor [--verbose] [--budget=<seconds>] [--cache] [--per-file] [--remote=<name>]...
+                  [--remote-timeout=<seconds>] [-- <pathspec>...]
 
 OPTIONS
-  --aggressive  Run a full scrubdown (might take a while)
-  -v --verbose  Show diagnostic messages
-  -h --help     Show program help
-  --version     Show program version
+  --budget=<seconds>      Limit the time spent on an examination
+  --cache                 Reuse results of examinations that are not affected by any changes
+  --per-file              Diagnose excluded files individually instead of by directory
+  --remote=<name>         Only examine this remote (can be repeated) instead of every remote
+  --remote-timeout=<seconds>
+                          Limit the time waited on each remote
+  --staged                Only examine changes staged for commit
+  --max-size=<size>       Size above which staged files are large (e.g. 500KB) [default: 1MB]
+  --aggressive            Run a full scrubdown (might take a while)
+  --optimize              Only write structures that speed up git (e.g. a commit-graph)
+  --threads=<count>       Limit the number of threads used to compress objects
+  --window-memory=<size>  Limit the memory used by each thread to compress objects (e.g. 256MB)
+  --max-pack-size=<size>  Limit the size of each pack written (e.g. 2GB)
+  --nice                  Run at the lowest CPU and IO priority
+  --socket=<path>         Serve requests over a socket instead of stdin/stdout
+  -v --verbose            Show diagnostic messages
+  -h --help               Show program help
+  --version               Show program version
 
 See https://github.com/jhauberg/gitdoctor for additional details.
 """
 
+import re
 import sys
-import math
+import subprocess
 
-from docopt import docopt
-
-from doctor import exit_if_not_compatible, enable_colors, __version__
-
-from doctor.diagnose import diagnose
-from doctor.examine import check_eligibility
-from doctor.scrub import trim
+from doctor import (
+    exit_if_not_compatible, enable_colors, is_windows_environment, command, __version__
+)
+from doctor.arguments import parse_or_exit, Usage, FLAG, VALUE, VALUES
 
 import doctor.repo as repo
 import doctor.report as report
 
+# note that examinations, scrubdowns and the server are only imported once needed; loading every
+# module up front would add to the startup time of every invocation (e.g. as a pre-commit hook)
+
+OPTIONS = {
+    '--budget': VALUE,
+    '--cache': FLAG,
+    '--per-file': FLAG,
+    '--remote': VALUES,
+    '--remote-timeout': VALUE,
+    '--staged': FLAG,
+    '--max-size': VALUE,
+    '--aggressive': FLAG,
+    '--optimize': FLAG,
+    '--threads': VALUE,
+    '--window-memory': VALUE,
+    '--max-pack-size': VALUE,
+    '--nice': FLAG,
+    '--socket': VALUE,
+    '--verbose': FLAG
+}
+
+OPTION_ALIASES = {'-v': '--verbose'}
+
+OPTION_DEFAULTS = {'--max-size': '1MB'}
+
+# each usage as listed in the program help, in order of precedence
+USAGES = [
+    Usage('scrub', ('--verbose', '--aggressive', '--optimize', '--threads', '--window-memory',
+                    '--max-pack-size', '--nice'),
+          exclusive=('--aggressive', '--optimize')),
+    Usage('serve', ('--socket',)),
+    Usage('--staged', ('--verbose', '--budget', '--max-size')),
+    Usage(None, ('--verbose', '--budget', '--cache', '--per-file', '--remote', '--remote-timeout',
+                 '<pathspec>'))
+]
+
+
+def size_from(text: str) -> int:
+    """ Return a size (in bytes) from a prettified string; e.g. '512', '500KB' or '2MB'.
+
+    Raise ValueError if the string does not represent a size.
+    """
+
+    match = re.match(r'^(\d+)\s*(B|KB|MB|GB)?$', text.strip(), re.IGNORECASE)
+
+    if match is None:
+        raise ValueError(f'not a size: {text}')
+
+    size_variants = ('B', 'KB', 'MB', 'GB')
+    size_index = size_variants.index((match.group(2) or 'B').upper())
+
+    return int(match.group(1)) * (1024 ** size_index)
+
+
+def present_outcomes(outcomes) -> bool:
+    """ Emit the diagnosis of any defective outcome, followed by any unavailable, failed or
+    unfinished examinations.
 
-def pretty_size(size_in_bytes: int) -> str:
-    """ Return a size (in bytes) as a prettified string. """
+    Return True if any examination failed, False otherwise.
+    """
 
-    size_variants = ('B', 'KB', 'MB')
-    size_index = int(math.floor(math.log(abs(size_in_bytes), 1024)))
-    size = round(abs(size_in_bytes) / math.pow(1024, size_index), 2)
+    from doctor.diagnose import present, DEFECTIVE, HEALTHY, FAILED, UNAVAILABLE
 
-    size_type = size_variants[size_index]
+    failed_examinations = []
+    unavailable_examinations = []
+    unfinished_examinations = []
 
-    precision = 2 if size_index > 1 else 0
+    for outcome in outcomes:
+        if outcome.status == DEFECTIVE:
+            present(outcome.diagnosis)
+        elif outcome.status == FAILED:
+            failed_examinations.append(f'{outcome.examination} ({outcome.error})')
+        elif outcome.status == UNAVAILABLE:
+            unavailable_examinations.append(f'{outcome.examination} ({outcome.error})')
+        elif outcome.status != HEALTHY:
+            unfinished_examinations.append(f'{outcome.examination} ({outcome.status})')
 
-    return f'{size:.{precision}f}{size_type}'
+    if len(unavailable_examinations) > 0:
+        for examination in unavailable_examinations:
+            report.note(examination)
+
+        report.conclude('examination is not available for this repository',
+                        supplement='These examinations were not run, as what they examine is not '
+                                   'available locally; no objects are fetched to examine it.')
+
+    if len(failed_examinations) > 0:
+        for examination in failed_examinations:
+            report.note(examination)
+
+        report.conclude('examination could not be completed',
+                        supplement='These examinations failed; any other examinations were not '
+                                   'affected. Run an examination using --verbose to see the git '
+                                   'commands involved.')
+
+    if len(unfinished_examinations) > 0:
+        for examination in unfinished_examinations:
+            report.note(examination)
+
+        report.conclude('examination was not completed within budget',
+                        supplement='These examinations were either cut short, as their share '
+                                   'of the budget ran out, or skipped entirely, as the budget ran '
+                                   'out. Run an examination using a larger budget (or none at all) '
+                                   'to complete them.')
+
+    return len(failed_examinations) > 0
 
 
 def main():
@@ -49,35 +157,157 @@ def main():
     exit_if_not_compatible()
     enable_colors()
 
-    argv = sys.argv
+    args = parse_or_exit(__doc__, sys.argv[1:], version='git-doctor ' + __version__.__version__,
+                         options=OPTIONS, usages=USAGES, aliases=OPTION_ALIASES,
+                         defaults=OPTION_DEFAULTS, operands='<pathspec>', is_separated=True)
+
+    # a single git invocation determines both whether git is installed and whether the current
+    # working directory is inside a work tree; each invocation adds noticeably to startup time
+    # note that this can not be folded into the first command of an examination; e.g. `git diff
+    # --cached` (the first command when examining staged changes) also succeeds inside the .git
+    # directory and in a bare repository, where examinations would fail or be meaningless
+    try:
+        is_inside_work_tree = repo.is_inside_work_tree()
+    except OSError:
+        report.conclude('git executable not found')
+        sys.exit(1)
+
+    if args['serve']:
+        from doctor.serve import Server, serve, serve_socket
 
-    # insert 'doctor' as first argument, otherwise docopt won't match the usage pattern
-    # (docopt doesn't care about matching name of calling program, so inserting this argument will
-    # work in both cases, whether using git redirection or calling the 'git-doctor' binary directly-
-    # the usage example could specify 'asdasd' as calling program and it would still work out-
-    # alternatively, replacing 'git doctor' with 'git-doctor' in the usage example would remove
-    # the need for inserting this argument, but it would look bad!)
-    argv[0] = 'doctor'
+        server = Server()
 
-    args = docopt(__doc__, argv=argv, version='git-doctor ' + __version__.__version__)
+        try:
+            if args['--socket'] is not None:
+                if is_windows_environment():
+                    report.conclude('serving over a socket is not supported on Windows')
+                    sys.exit(1)
 
-    if not repo.can_be_examined():
-        report.conclude('git executable not found')
-        sys.exit(1)
+                serve_socket(server, args['--socket'])
+            else:
+                serve(server, sys.stdin, sys.stdout)
+        except OSError as error:
+            report.conclude(f'could not serve: {error}')
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+
+        sys.exit(0)
 
     is_verbose = args['--verbose']
 
-    if not repo.exists():
+    budget = None
+
+    if args['--budget'] is not None:
+        try:
+            budget = float(args['--budget'])
+        except ValueError:
+            budget = 0
+
+        if budget <= 0:
+            report.conclude('budget must be a positive number of seconds')
+            sys.exit(1)
+
+    remote_timeout = None
+
+    if args['--remote-timeout'] is not None:
+        try:
+            remote_timeout = float(args['--remote-timeout'])
+        except ValueError:
+            remote_timeout = 0
+
+        if remote_timeout <= 0:
+            report.conclude('remote timeout must be a positive number of seconds')
+            sys.exit(1)
+
+    if args['scrub']:
+        from doctor.scrub import trim, optimize, Limits
+
+        try:
+            threads = int(args['--threads']) if args['--threads'] is not None else None
+        except ValueError:
+            threads = 0
+
+        if threads is not None and threads <= 0:
+            report.conclude('threads must be a positive number')
+            sys.exit(1)
+
+        try:
+            window_memory, pack_size_limit = (
+                size_from(args[option]) if args[option] is not None else None
+                for option in ('--window-memory', '--max-pack-size'))
+        except ValueError:
+            report.conclude('size must be a number of bytes; optionally suffixed by KB, MB or GB')
+            sys.exit(1)
+
+        limits = Limits(threads=threads,
+                        window_memory=window_memory,
+                        pack_size_limit=pack_size_limit,
+                        is_lowered=args['--nice'])
+
+    if not is_inside_work_tree:
         # note that this also reports False when inside the .git folder of a repository
         report.conclude('must be inside a work tree')
         sys.exit(1)
 
+    if args['--staged']:
+        try:
+            size_limit = size_from(args['--max-size'])
+        except ValueError:
+            report.conclude('size must be a number of bytes; optionally suffixed by KB, MB or GB')
+            sys.exit(1)
+
+        from doctor.diagnose import diagnose_staged
+
+        # examining staged changes only is meant to be fast (e.g. as a pre-commit hook); so skip
+        # the eligibility check, as that involves checking every object in the repository
+        outcomes = diagnose_staged(verbose=is_verbose, deadline=command.deadline_from(budget),
+                                   size_limit=size_limit)
+
+        has_failed = present_outcomes(outcomes)
+
+        sys.exit(1 if has_failed else 0)
+
+    from doctor.diagnose import diagnose, find_unknown_remotes, check_cached_eligibility
+    from doctor.examine import check_eligibility
+
+    # note that an empty list means that no remote was provided; not that no remote is examined
+    remotes = args['--remote'] if len(args['--remote']) > 0 else None
+
+    unknown_remotes = find_unknown_remotes(remotes)
+
+    if len(unknown_remotes) > 0:
+        report.conclude(f'unknown remotes: {", ".join(unknown_remotes)}')
+        sys.exit(1)
+
     scrubdown = args['scrub']
 
     # determine whether repo seems to be alright and working as expected
     # if the repo has bad files, files in odd places or similar, then we can't be sure
     # that git commands will work or produce the expected results; so bail out if that is the case
-    is_eligible, issues = check_eligibility(verbose=is_verbose)
+    # the eligibility check counts toward the budget, as it can be just as costly as any examination
+    deadline = command.deadline_from(budget)
+
+    # when using the cache, the eligibility check is skipped if the repository was found eligible
+    # before and has not changed since; note that a scrubdown always checks
+    results = None
+
+    try:
+        if args['--cache']:
+            from doctor import cache
+
+            results = cache.load()
+
+            is_eligible, issues = check_cached_eligibility(results, verbose=is_verbose,
+                                                           deadline=deadline)
+        else:
+            is_eligible, issues = check_eligibility(verbose=is_verbose, deadline=deadline)
+    except subprocess.TimeoutExpired:
+        report.conclude('eligibility could not be determined within budget',
+                        supplement='Run an examination using a larger budget (or none at all).')
+        sys.exit(1)
 
     if not is_eligible:
         for issue in issues:
@@ -88,15 +318,49 @@ def main():
         report.conclude(f'repository is not eligible for {examination_or_scrubdown}')
         sys.exit(1)
 
-    if scrubdown:
-        size_difference = trim(aggressively=args['--aggressive'], verbose=is_verbose)
+    # progress is only shown in a terminal, as it is continuously rewritten
+    show_progress = sys.stderr.isatty()
+
+    if scrubdown and args['--optimize']:
+        timings_before, timings_after, failed_structures = optimize(
+            verbose=is_verbose, limits=limits, show_progress=show_progress)
+
+        for traversal, timing in timings_after.items():
+            report.note(f'{traversal} traversal took {timing * 1000:.0f}ms '
+                        f'(before: {timings_before[traversal] * 1000:.0f}ms)')
+
+        if len(failed_structures) > 0:
+            for structure in failed_structures:
+                report.note(f'{structure} could not be written')
+
+            supplement = 'Run using --verbose to see the git commands involved.'
+
+            if 'reachability bitmap' in failed_structures:
+                supplement += ' Note that writing a reachability bitmap requires git 2.34 or later.'
+
+            report.conclude('acceleration structures were not all written', supplement=supplement)
+            sys.exit(1)
+
+        report.conclude('acceleration structures were written', positive=True)
+    elif scrubdown:
+        size_difference = trim(aggressively=args['--aggressive'], verbose=is_verbose,
+                               limits=limits, show_progress=show_progress)
 
         if size_difference < 0:
-            size = pretty_size(size_difference)
+            size = report.pretty_size(size_difference)
 
             report.conclude(f'restored approximately {size} of disk space', positive=True)
     else:
-        diagnose(verbose=is_verbose)
+        # pathspecs are relative to the current working directory, but examinations (of files)
+        # run from the root of the repository
+        pathspecs = repo.pathspecs_from_root(args['<pathspec>'])
+
+        outcomes = diagnose(verbose=is_verbose, deadline=deadline, use_cache=args['--cache'],
+                            pathspecs=pathspecs, per_file=args['--per-file'], remotes=remotes,
+                            remote_timeout=remote_timeout, results=results)
+
+        if present_outcomes(outcomes):
+            sys.exit(1)
 
     sys.exit(0)
 
@@ -0,0 +1,164 @@
+# coding=utf-8
+
+"""
+Provides a minimal parser of command-line arguments for a usage that is known in advance.
+
+Unlike docopt (or argparse), the usage is not derived from the program help on every invocation;
+this keeps startup fast, which matters when run often and briefly (e.g. as a pre-commit hook).
+"""
+
+import sys
+
+from typing import NamedTuple
+
+FLAG = 'flag'  # an option that takes no value; e.g. --cache
+VALUE = 'value'  # an option that takes a value; e.g. --budget=<seconds>
+VALUES = 'values'  # an option that takes a value and can be repeated; e.g. --remote=<name>...
+
+HELP_OPTIONS = ('-h', '--help')
+VERSION_OPTIONS = ('--version',)
+
+# the argument that marks the end of options; any argument after it is an operand
+SEPARATOR = '--'
+
+
+class Usage(NamedTuple):
+    """ Represents a single usage pattern of a program; e.g. `git doctor serve [--socket=<path>]`.
+
+    A usage is selected by a command (e.g. 'serve') or an option (e.g. '--staged'), or by nothing
+    at all (None) for the default usage. Only the options listed (and operands, if named) are
+    allowed when the usage is selected.
+    """
+
+    selector: str  # a command or option; or None
+    options: tuple  # the options, and name of operands (e.g. '<pathspec>'), that are allowed
+    exclusive: tuple = ()  # options that cannot be combined; e.g. ('--aggressive', '--optimize')
+
+
+class UsageError(Exception):
+    """ Raised when arguments do not match any usage of a program. """
+
+
+def usage_from(doc: str) -> str:
+    """ Return the usage section of a program help; i.e. everything until the first blank line. """
+
+    return doc.strip().split('\n\n', 1)[0]
+
+
+def parse(argv: list, options: dict, usages: list, aliases: dict=None, defaults: dict=None,
+          operands: str='<operand>', is_separated: bool=False) -> dict:
+    """ Return a dictionary of arguments, similar to the one returned by docopt.
+
+    Options are given by name along with their kind (FLAG, VALUE or VALUES), and any aliases map
+    short options to their full name; e.g. {'-v': '--verbose'}. Each option, command and operand is
+    included, whether provided or not; e.g. {'--cache': False, 'serve': True, '<pathspec>': []}.
+
+    Any operand is collected under the name of operands. If is_separated is True, operands must
+    follow the separator ('--'); e.g. `git doctor -- docs`.
+
+    Raise UsageError if the arguments do not match a usage.
+    """
+
+    aliases = aliases or {}
+    commands = [usage.selector for usage in usages
+                if usage.selector is not None and not usage.selector.startswith('-')]
+
+    args = {option: ([] if kind == VALUES else None if kind == VALUE else False)
+            for option, kind in options.items()}
+    args.update({command: False for command in commands})
+    args.update(defaults or {})
+    args[operands] = []
+
+    provided = []
+
+    remaining = list(argv)
+
+    while len(remaining) > 0:
+        argument = remaining.pop(0)
+
+        if argument == SEPARATOR:
+            provided.append(operands)
+            args[operands].extend(remaining)
+
+            break
+
+        if argument.startswith('-') and len(argument) > 1:
+            option, has_value, value = argument.partition('=')
+            option = aliases.get(option, option)
+
+            kind = options.get(option)
+
+            if kind is None:
+                raise UsageError(f'unknown option: {option}')
+
+            if kind == FLAG:
+                if has_value:
+                    raise UsageError(f'option does not take a value: {option}')
+
+                args[option] = True
+            else:
+                if not has_value:
+                    if len(remaining) == 0:
+                        raise UsageError(f'option requires a value: {option}')
+
+                    value = remaining.pop(0)
+
+                if kind == VALUES:
+                    args[option].append(value)
+                elif option in provided:
+                    raise UsageError(f'option can only be provided once: {option}')
+                else:
+                    args[option] = value
+
+            provided.append(option)
+        elif argument in commands and not any(command in provided for command in commands):
+            args[argument] = True
+            provided.append(argument)
+        elif not is_separated:
+            provided.append(operands)
+            args[operands].append(argument)
+        else:
+            raise UsageError(f'unexpected argument: {argument}')
+
+    # the first usage that is selected by any of the arguments applies
+    usage = next(usage for usage in usages
+                 if usage.selector is None or usage.selector in provided)
+
+    for argument in provided:
+        if argument != usage.selector and argument not in usage.options:
+            raise UsageError(f'unexpected argument: {argument}')
+
+    combined = [option for option in usage.exclusive if option in provided]
+
+    if len(combined) > 1:
+        raise UsageError(f'options cannot be combined: {", ".join(combined)}')
+
+    if operands in usage.options and len(args[operands]) == 0 and not is_separated:
+        # operands are required, unless they follow a separator (and are optional)
+        raise UsageError(f'missing {operands}')
+
+    return args
+
+
+def parse_or_exit(doc: str, argv: list, version: str=None, **kwargs) -> dict:
+    """ Return a dictionary of arguments (see parse).
+
+    Exit with zero status if help or version was requested, or with non-zero status (showing
+    usage) if the arguments do not match a usage.
+    """
+
+    # note that anything after the separator is an operand, even if it looks like an option
+    options = argv[:argv.index(SEPARATOR)] if SEPARATOR in argv else argv
+
+    if any(option in HELP_OPTIONS for option in options):
+        print(doc.strip('\n'))
+        sys.exit(0)
+
+    if version is not None and any(option in VERSION_OPTIONS for option in options):
+        print(version)
+        sys.exit(0)
+
+    try:
+        return parse(argv, **kwargs)
+    except UsageError as error:
+        sys.exit(f'{error}\n{usage_from(doc)}')
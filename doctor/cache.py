@@ -0,0 +1,160 @@
+# coding=utf-8
+
+"""
+Provides a persisted cache of examination results for the current repository.
+
+Each examination declares the inputs it depends on (e.g. the index or the state of all references).
+A result is stored along with a fingerprint of those inputs, and can be reused by later examinations
+for as long as the fingerprint stays the same.
+"""
+
+import os
+import json
+import hashlib
+import threading
+
+import doctor.repo as repo
+
+from doctor.__version__ import __version__
+
+# the cache is stored inside the .git directory, and is never tracked or shared
+CACHE_FILENAME = 'doctor-cache.json'
+
+# note that any difference in version discards the cache completely
+CACHE_VERSION = f'git-doctor {__version__}'
+
+
+def load(repo_path: str=None) -> dict:
+    """ Return the persisted cache of current repository.
+
+    Return an empty cache if none was found, or if it was persisted by another version.
+    """
+
+    path = os.path.join(repo.git_path(repo_path=repo_path), CACHE_FILENAME)
+
+    try:
+        with open(path) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+        return {}
+
+    return cache
+
+
+def store(cache: dict, repo_path: str=None):
+    """ Persist the cache of current repository. """
+
+    path = os.path.join(repo.git_path(repo_path=repo_path), CACHE_FILENAME)
+
+    cache['version'] = CACHE_VERSION
+
+    # write to a temporary file first, then replace; so that an interrupted write
+    # (or a concurrent examination) never leaves a partially written cache behind
+    temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    try:
+        with open(temporary_path, 'w') as file:
+            json.dump(cache, file)
+
+        os.replace(temporary_path, path)
+    except OSError:
+        # failing to persist the cache is not a problem; the next examination just runs fully
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+def lookup(cache: dict, name: str, fingerprint: str) -> (bool, object):
+    """ Return True and the cached result of an examination if its fingerprint matches.
+
+    Return False (and None) otherwise.
+    """
+
+    entry = cache.get('results', {}).get(name)
+
+    if entry is None or entry.get('fingerprint') != fingerprint:
+        return False, None
+
+    return True, entry.get('result')
+
+
+def remember(cache: dict, name: str, fingerprint: str, result):
+    """ Put the result of an examination into the cache, replacing any previous result.
+
+    The result must be serializable as JSON.
+    """
+
+    results = cache.setdefault('results', {})
+    results[name] = {'fingerprint': fingerprint, 'result': result}
+
+
+def eligibility(deadline: float=None, repo_path: str=None) -> str:
+    """ Return a fingerprint of everything that the eligibility check of current repository
+    depends on (see examine.check_eligibility).
+
+    The eligibility check involves checking every object in the repository; but its result can only
+    change along with the objects, references or index.
+    """
+
+    return fingerprint([repo.objects_state, repo.refs_state, repo.index_checksum], {}, deadline,
+                       repo_path)
+
+
+def fingerprint(inputs: list, values: dict, deadline: float=None, repo_path: str=None) -> str:
+    """ Return a fingerprint of the current state of a list of inputs.
+
+    An input is either a function that returns its state (given a deadline and a repo_path), or any
+    other value that can be represented as a string (e.g. an option that affects the result).
+
+    The state of each input function is only determined once, and is kept in values; so that inputs
+    that are shared by several examinations do not need to be determined again.
+    """
+
+    digest = hashlib.sha1()
+
+    for value in inputs:
+        if callable(value):
+            if value not in values:
+                values[value] = value(deadline=deadline, repo_path=repo_path)
+
+            value = values[value]
+
+        digest.update(repr(value).encode('utf-8'))
+        # separate each input so that adjacent inputs can not be confused for each other
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+def exclusion_rules(cache: dict, deadline: float=None, repo_path: str=None) -> str:
+    """ Return the state of all gitignore-rules that apply to tracked files in current repository.
+
+    The state changes whenever any file that holds such rules is changed, created or removed;
+    whether the file is tracked or not.
+    """
+
+    # finding every directory that could hold a .gitignore requires listing all tracked files;
+    # the list only changes when the index does, so it is persisted and reused until then
+    index = repo.index_checksum(deadline, repo_path)
+    entry = cache.get('directories')
+
+    if entry is None or entry.get('index') != index:
+        entry = {'index': index, 'paths': repo.tracked_directories(deadline, repo_path)}
+
+        cache['directories'] = entry
+
+    state = []
+
+    for filepath in repo.exclusion_filepaths(entry['paths'], deadline, repo_path):
+        try:
+            with open(filepath, 'rb') as file:
+                state.append(hashlib.sha1(file.read()).hexdigest())
+        except OSError:
+            # the file does not exist (or can not be read, in which case git ignores it as well)
+            state.append(None)
+
+    return ' '.join(str(digest) for digest in state)
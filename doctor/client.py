@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+usage: doctor.client [options] <path>...
+
+Send requests to a git-doctor server (see `git doctor serve`), and print each response along with
+the time it took to arrive. Meant for testing and measuring a server locally; run it using
+`python -m doctor.client`.
+
+Unless a socket is provided, a server is started for the duration of the requests.
+
+OPTIONS
+  --socket=<path>     Connect to a server listening on a socket
+  --repeat=<count>    Number of times to request each path [default: 1]
+  --staged            Only examine changes staged for commit
+  --budget=<seconds>  Limit the time spent on each examination
+  -h --help           Show program help
+"""
+
+import sys
+import json
+import time
+import socket
+import subprocess
+
+from doctor.arguments import parse_or_exit, Usage, FLAG, VALUE
+
+OPTIONS = {
+    '--socket': VALUE,
+    '--repeat': VALUE,
+    '--staged': FLAG,
+    '--budget': VALUE
+}
+
+USAGES = [
+    Usage(None, ('--socket', '--repeat', '--staged', '--budget', '<path>'))
+]
+
+
+def requests_from(paths: list, repeat: int, options: dict) -> list:
+    """ Return a list of requests for examining each path a number of times. """
+
+    return [{'id': f'{path}#{number}', 'path': path, 'options': options}
+            for number in range(1, repeat + 1)
+            for path in paths]
+
+
+def exchange(requests: list, input, output):
+    """ Write each request to a server, and print its responses as they arrive. """
+
+    for request in requests:
+        started = time.monotonic()
+
+        input.write(json.dumps(request).encode('utf-8') + b'\n')
+        input.flush()
+
+        for line in output:
+            response = json.loads(line)
+            elapsed = (time.monotonic() - started) * 1000
+
+            print(f'{elapsed:8.1f}ms {json.dumps(response)}')
+
+            if response.get('done'):
+                break
+        else:
+            sys.exit('server stopped responding')
+
+
+def main():
+    """ Entry point for invoking the git-doctor test client. """
+
+    args = parse_or_exit(__doc__, sys.argv[1:], options=OPTIONS, usages=USAGES,
+                         defaults={'--repeat': '1'}, operands='<path>')
+
+    options = {}
+
+    if args['--staged']:
+        options['staged'] = True
+
+    if args['--budget'] is not None:
+        options['budget'] = float(args['--budget'])
+
+    requests = requests_from(args['<path>'], int(args['--repeat']), options)
+
+    if args['--socket'] is not None:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(args['--socket'])
+
+            with connection.makefile('wb') as input, connection.makefile('rb') as output:
+                exchange(requests, input, output)
+    else:
+        server = subprocess.Popen([sys.executable, '-m', 'doctor', 'serve'],
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE)
+
+        try:
+            exchange(requests, server.stdin, server.stdout)
+        finally:
+            # ending the input stops the server
+            server.stdin.close()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,22 +4,349 @@
 Provides a common interface for executing commands.
 """
 
+import os
+import re
 import sys
+import time
+import shlex
+import signal
+import threading
 import subprocess
 
 import doctor.report as report
 
+from doctor import is_windows_environment
 from doctor.report import supports_color
 
+# the time (in seconds) given to a cancelled process to exit by itself before it is killed
+CANCELLATION_GRACE_PERIOD = 1
 
-def get_argv(cmd: str) -> list:
-    """ Return a list of arguments from a fully-formed command line. """
+# the niceness of processes run at lowered priority; i.e. the lowest CPU priority
+LOWERED_NICENESS = 19
 
-    return cmd.strip().split(' ')
+# variables set in the environment of every process; objects missing from a partial clone are never
+# fetched on demand, as that could turn a local examination into minutes of network traffic
+# (note that this is only respected by git 2.44 or later; so examinations also avoid looking up
+# any object that could be missing in the first place)
+ENVIRONMENT = {'GIT_NO_LAZY_FETCH': '1'}
 
 
-def display(cmd: str):
-    """ Emit a diagnostic message that looks like the execution of a command line. """
+def get_argv(cmd: str, paths: list=None) -> list:
+    """ Return a list of arguments from a fully-formed command line.
+
+    If any paths (or pathspecs) are provided, append them as arguments following '--'; so that they
+    are never mistaken for options, nor split if containing spaces.
+    """
+
+    argv = cmd.strip().split(' ')
+
+    if paths is not None and len(paths) > 0:
+        argv.append('--')
+        argv.extend(paths)
+
+    return argv
+
+
+def environment(env: dict=None) -> dict:
+    """ Return an environment for a process; i.e. the provided environment (or the environment of
+    the current process) along with any variables in ENVIRONMENT.
+    """
+
+    return dict(os.environ if env is None else env, **ENVIRONMENT)
+
+
+def deadline_from(seconds: float=None) -> float:
+    """ Return a deadline that passes in a number of seconds from now.
+
+    Return None if seconds is None; i.e. no deadline.
+    """
+
+    if seconds is None:
+        return None
+
+    return time.monotonic() + seconds
+
+
+def time_left(deadline: float=None) -> float:
+    """ Return the number of seconds left until a deadline passes, or None if there is no deadline.
+
+    The result is never negative; a deadline that has already passed has 0 seconds left.
+    """
+
+    if deadline is None:
+        return None
+
+    return max(deadline - time.monotonic(), 0)
+
+
+def share_of(deadline: float=None, count: int=1) -> float:
+    """ Return a deadline for one of a number of tasks that share the time left until a deadline
+    equally; i.e. that passes once the task has used up its share.
+
+    Return None if there is no deadline.
+    """
+
+    if deadline is None:
+        return None
+
+    return min(time.monotonic() + time_left(deadline) / max(count, 1), deadline)
+
+
+def cancel(process: subprocess.Popen, as_group: bool=False):
+    """ Cancel a running process.
+
+    The process is first asked to terminate; giving it a chance to clean up (e.g. git removes any
+    lock files it holds). If it has not exited after a grace period, it is killed.
+
+    If as_group is True, signal the entire process group led by the process; i.e. including any
+    processes it has spawned (e.g. ssh or git-remote-https). Not supported on Windows.
+    """
+
+    def send(signum):
+        try:
+            if as_group:
+                os.killpg(process.pid, signum)
+            else:
+                process.send_signal(signum)
+        except ProcessLookupError:
+            pass
+
+    send(signal.SIGTERM)
+
+    try:
+        process.wait(timeout=CANCELLATION_GRACE_PERIOD)
+    except subprocess.TimeoutExpired:
+        pass
+
+    if as_group or process.poll() is None:
+        # note that even if the leading process has exited, its spawned processes might not have
+        send(signal.SIGKILL if not is_windows_environment() else signal.SIGTERM)
+
+
+def run(cmd, deadline: float=None, check: bool=False, input: bytes=None,
+        **kwargs) -> subprocess.CompletedProcess:
+    """ Run a command-line process to completion and return the completed process.
+
+    The command can be either a fully-formed command line, or a list of arguments. Any additional
+    keyword arguments are passed on to subprocess.Popen. The environment of the process always
+    includes the variables in ENVIRONMENT.
+
+    If input is provided, it is written to the stdin of the process.
+
+    If a deadline is provided (see deadline_from), the process is cancelled if it has not completed
+    before the deadline passes, in which case subprocess.TimeoutExpired is raised. A process is
+    never started if the deadline has already passed.
+
+    If check is True, raise subprocess.CalledProcessError on non-zero exit status.
+    """
+
+    argv = get_argv(cmd) if isinstance(cmd, str) else cmd
+
+    timeout = time_left(deadline)
+
+    if timeout is not None and timeout <= 0:
+        raise subprocess.TimeoutExpired(argv, timeout=0)
+
+    # put the process in its own process group so that it can be cancelled as a whole
+    as_group = deadline is not None and not is_windows_environment()
+
+    if as_group:
+        kwargs['start_new_session'] = True
+
+    if input is not None:
+        kwargs['stdin'] = subprocess.PIPE
+
+    kwargs['env'] = environment(kwargs.get('env'))
+
+    with subprocess.Popen(argv, **kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(input, timeout=timeout)
+        except (subprocess.TimeoutExpired, KeyboardInterrupt):
+            cancel(process, as_group)
+            # reap the process and close any pipes
+            process.communicate()
+
+            raise
+
+    result = subprocess.CompletedProcess(argv, process.returncode, stdout, stderr)
+
+    if check:
+        result.check_returncode()
+
+    return result
+
+
+def records(cmd, separator: bytes=b'\0', deadline: float=None, **kwargs):
+    """ Run a command-line process and yield each record of its output as soon as it is written;
+    i.e. without holding the entire output in memory.
+
+    Records are separated by a separator (e.g. a null byte, as output by git when given -z), and
+    are yielded as bytes; including any empty records, but not the separator.
+
+    See run for details on the command, deadline and any additional keyword arguments. Note that the
+    process is cancelled if the records are not read to the end.
+
+    Raise subprocess.CalledProcessError on non-zero exit status; once every record has been read.
+    """
+
+    argv = get_argv(cmd) if isinstance(cmd, str) else cmd
+
+    timeout = time_left(deadline)
+
+    if timeout is not None and timeout <= 0:
+        raise subprocess.TimeoutExpired(argv, timeout=0)
+
+    # put the process in its own process group so that it can be cancelled as a whole
+    as_group = deadline is not None and not is_windows_environment()
+
+    if as_group:
+        kwargs['start_new_session'] = True
+
+    kwargs['env'] = environment(kwargs.get('env'))
+
+    with subprocess.Popen(argv, stdout=subprocess.PIPE, **kwargs) as process:
+        # cancelling the process ends any blocked read below
+        timer = threading.Timer(timeout, cancel, (process, as_group)) if timeout is not None \
+            else None
+
+        if timer is not None:
+            timer.start()
+
+        try:
+            output = b''
+
+            while True:
+                chunk = process.stdout.read1(64 * 1024)
+
+                if len(chunk) == 0:
+                    break
+
+                *lines, output = (output + chunk).split(separator)
+
+                yield from lines
+
+            if len(output) > 0:
+                yield output
+        except BaseException:
+            # e.g. reading stopped early, or interrupted
+            cancel(process, as_group)
+
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        process.wait()
+
+    if process.returncode != 0:
+        if timer is not None and time_left(deadline) == 0:
+            raise subprocess.TimeoutExpired(argv, timeout)
+
+        # any records read so far can not be relied on to be complete
+        raise subprocess.CalledProcessError(process.returncode, argv)
+
+
+class Helper:
+    """ Represents a long-running process that answers each line of input with a line of output;
+    e.g. `git cat-file --batch-check`.
+
+    A helper avoids the cost of starting a new process for every query. The process is started on
+    the first query, and restarted if it has exited since.
+    """
+
+    def __init__(self, cmd, cwd: str=None):
+        self.argv = get_argv(cmd) if isinstance(cmd, str) else cmd
+        self.cwd = cwd
+        self.process = None
+        # a helper can only answer one query at a time
+        self.lock = threading.Lock()
+
+    def query(self, lines: list, deadline: float=None) -> list:
+        """ Write lines to the helper and return the lines it answers with.
+
+        If a deadline is provided, the helper is stopped if it has not answered before the deadline
+        passes, in which case subprocess.TimeoutExpired is raised.
+        """
+
+        with self.lock:
+            timeout = time_left(deadline)
+
+            if timeout is not None and timeout <= 0:
+                raise subprocess.TimeoutExpired(self.argv, timeout=0)
+
+            if self.process is None or self.process.poll() is not None:
+                self.process = subprocess.Popen(
+                    self.argv,
+                    cwd=self.cwd,
+                    env=environment(),
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL)
+
+            process = self.process
+
+            # write from another thread; writing every line before reading could otherwise block
+            # forever if the helper is blocked on writing answers that are not yet being read
+            def write():
+                try:
+                    process.stdin.write(''.join(f'{line}\n' for line in lines).encode('utf-8'))
+                    process.stdin.flush()
+                except OSError:
+                    # the helper was stopped; this is discovered when reading as well
+                    pass
+
+            writer = threading.Thread(target=write, daemon=True)
+            writer.start()
+
+            # stopping the helper ends any blocked read below
+            timer = threading.Timer(timeout, process.kill) if timeout is not None else None
+
+            if timer is not None:
+                timer.start()
+
+            try:
+                answers = [process.stdout.readline() for _ in lines]
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+            writer.join()
+
+            if any(len(answer) == 0 for answer in answers):
+                # the helper exited before answering every line
+                self.close()
+
+                if timeout is not None and time_left(deadline) == 0:
+                    raise subprocess.TimeoutExpired(self.argv, timeout)
+
+                raise subprocess.CalledProcessError(process.returncode, self.argv)
+
+            return [answer.decode('utf-8').rstrip('\n') for answer in answers]
+
+    def close(self):
+        """ Stop the helper, if running. """
+
+        if self.process is None:
+            return
+
+        if self.process.poll() is None:
+            self.process.kill()
+
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+        self.process = None
+
+
+def display(cmd):
+    """ Emit a diagnostic message that looks like the execution of a command line.
+
+    The command can be either a fully-formed command line, or a list of arguments.
+    """
+
+    if not isinstance(cmd, str):
+        cmd = ' '.join(shlex.quote(arg) for arg in cmd)
 
     diagnostic = f'$ {cmd}'
     diagnostic = f'\x1b[0;37m{diagnostic}\x1b[0m' if supports_color(sys.stderr) else diagnostic
@@ -27,9 +354,35 @@ def display(cmd: str):
     report.information(diagnostic, wrapped=False)
 
 
-def execute(cmd: str, show_argv: bool=False, show_output: bool=False) -> int:
+def lowered(argv: list) -> (list, dict):
+    """ Return a list of arguments, and any keyword arguments for subprocess.Popen, that run a
+    command at the lowest CPU priority and a lowered IO priority; so that it does not starve other
+    processes.
+
+    IO priority is only lowered where supported (i.e. where `ionice` is available).
+    """
+
+    if is_windows_environment():
+        return argv, {'creationflags': subprocess.IDLE_PRIORITY_CLASS}
+
+    import shutil
+
+    prefix = ['nice', '-n', str(LOWERED_NICENESS)]
+
+    if shutil.which('ionice') is not None:
+        # the lowest priority of the best-effort class; note that the idle class could stall
+        # the process for as long as any other process is using the disk
+        prefix.extend(['ionice', '-c', '2', '-n', '7'])
+
+    return prefix + argv, {}
+
+
+def execute(cmd, show_argv: bool=False, show_output: bool=False, **kwargs) -> int:
     """ Execute a command-line process and return exit code.
 
+    The command can be either a fully-formed command line, or a list of arguments. Any additional
+    keyword arguments are passed on to subprocess.run.
+
     If show_argv is True, display the executed command with parameters/arguments.
     If show_output is True, display the resulting output from the executed command.
 
@@ -38,14 +391,81 @@ def execute(cmd: str, show_argv: bool=False, show_output: bool=False) -> int:
     depending on the executed command.
     """
 
-    argv = get_argv(cmd)
+    argv = get_argv(cmd) if isinstance(cmd, str) else cmd
 
     if show_argv:
         display(cmd)
 
+    kwargs['env'] = environment(kwargs.get('env'))
+
     result = subprocess.run(
         argv,
         stdout=sys.stdout if show_output else subprocess.DEVNULL,
-        stderr=sys.stderr if show_output else subprocess.DEVNULL)
+        stderr=sys.stderr if show_output else subprocess.DEVNULL,
+        **kwargs)
 
     return result.returncode
+
+
+def follow(cmd, on_output, **kwargs) -> int:
+    """ Execute a command-line process and return exit code, passing each line of its output to a
+    function as soon as it is written.
+
+    The command can be either a fully-formed command line, or a list of arguments. Any additional
+    keyword arguments are passed on to subprocess.Popen.
+
+    Output is read through a pseudo-terminal (except on Windows), so that the process behaves as if
+    run interactively; e.g. git reports progress only when run interactively. Note that a progress
+    report typically rewrites its line (ending it by a carriage return instead of a newline), and
+    each rewrite is passed on as a line of its own.
+    """
+
+    argv = get_argv(cmd) if isinstance(cmd, str) else cmd
+
+    kwargs['env'] = environment(kwargs.get('env'))
+
+    if is_windows_environment():
+        with subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, **kwargs) as process:
+            for line in process.stdout:
+                on_output(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+
+        return process.returncode
+
+    import pty
+
+    reader, writer = pty.openpty()
+
+    try:
+        process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=writer, stderr=writer,
+                                   **kwargs)
+    finally:
+        # only the process writes to the terminal; closing it here lets reading end once it exits
+        os.close(writer)
+
+    output = b''
+
+    try:
+        while True:
+            try:
+                chunk = os.read(reader, 4096)
+            except OSError:
+                # reading from a pseudo-terminal that is no longer written to fails on some systems,
+                # instead of just ending
+                chunk = b''
+
+            if len(chunk) == 0:
+                break
+
+            *lines, output = re.split(rb'[\r\n]', output + chunk)
+
+            for line in lines:
+                if len(line) > 0:
+                    on_output(line.decode('utf-8', errors='replace'))
+    finally:
+        os.close(reader)
+
+    if len(output) > 0:
+        on_output(output.decode('utf-8', errors='replace'))
+
+    return process.wait()
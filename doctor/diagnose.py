@@ -4,84 +4,329 @@
 Provides functions for diagnosing defects in the current repository.
 """
 
-from doctor.report import note, conclude
+import posixpath
+import subprocess
+
+from typing import NamedTuple
+from functools import partial
+
+from doctor import command
+from doctor.report import note, conclude, pretty_size
 from doctor.examine import *
 
 
-def examine_scrubdown(verbose: bool=False):
+# names of all examinations, in the order they are run
+EXAMINATIONS = ('readme', 'acceleration-structures', 'unwanted-files', 'excluded-files',
+                'missing-tags', 'redundant-branches', 'scrubdown', 'unwanted-history')
+
+# names of all examinations of changes staged for commit, in the order they are run
+STAGED_EXAMINATIONS = ('staged-unwanted-files', 'staged-large-files', 'staged-exclusion-rules')
+
+# the size (in bytes) above which a staged file is considered large, unless otherwise specified
+STAGED_SIZE_LIMIT = 1024 * 1024
+
+# the number of packs above which lookups are considered slow without a multi-pack-index
+# (each pack is otherwise searched in turn)
+UNINDEXED_PACK_LIMIT = 10
+
+# the number of commits missing from the commit-graph at which traversals are considered slow
+# (a few commits made since the commit-graph was written make no noticeable difference)
+UNGRAPHED_COMMIT_LIMIT = 1000
+
+# the number of packed objects below which counting objects is fast enough without a bitmap
+BITMAP_OBJECT_LIMIT = 100000
+
+# the fraction of packed objects not covered by a bitmap above which the bitmap is considered stale
+UNBITMAPPED_OBJECT_FRACTION = 0.1
+
+# the status of an examination that ran to completion and did not discover any defects
+HEALTHY = 'healthy'
+# the status of an examination that ran to completion and discovered one or more defects
+DEFECTIVE = 'defective'
+# the status of an examination that did not run to completion before its deadline passed
+CUT_SHORT = 'cut short'
+# the status of an examination that did not run at all, because its deadline had already passed
+SKIPPED = 'skipped'
+# the status of an examination that could not run to completion because of an error; e.g. a git
+# command that failed, or a remote that could not be reached
+FAILED = 'failed'
+# the status of an examination that can not run in current repository, because what it examines
+# is not available; e.g. history in a partial clone that is missing trees
+UNAVAILABLE = 'unavailable'
+
+
+class Diagnosis(NamedTuple):
+    """ Represents the defects discovered by an examination. """
+
+    message: str  # concluding message
+    supplement: str  # advice on how to resolve the defects
+    notes: list  # any specific defects; e.g. filenames
+
+
+class Outcome(NamedTuple):
+    """ Represents the outcome of an examination. """
+
+    examination: str  # name of the examination; see EXAMINATIONS
+    status: str  # any of HEALTHY, DEFECTIVE, CUT_SHORT, SKIPPED, FAILED or UNAVAILABLE
+    diagnosis: Diagnosis  # only when status is DEFECTIVE, None otherwise
+    error: str = None  # why, only when status is FAILED or UNAVAILABLE, None otherwise
+
+
+def examine_scrubdown(verbose: bool=False, deadline: float=None, is_partial_clone: bool=False,
+                      repo_path: str=None) -> Diagnosis:
     """ Examine and diagnose whether current repository could use a scrubdown. """
 
-    unreachables = find_unreachable_objects(verbose)
+    unreachables = find_unreachable_objects(verbose, deadline, repo_path)
 
-    if len(unreachables) == 0:
-        return
+    if is_partial_clone:
+        # git does not follow objects fetched from a promisor remote when determining reachability;
+        # so these can be reported as unreachable even when they are not (a scrubdown keeps them
+        # regardless); assume format like 'unreachable <type> <object>'
+        promised_objects = find_promised_objects(
+            [unreachable.split(' ')[-1] for unreachable in unreachables], deadline, repo_path)
+
+        unreachables = [unreachable for unreachable in unreachables
+                        if unreachable.split(' ')[-1] not in promised_objects]
 
-    for unreachable in unreachables:
-        note(unreachable)
+    if len(unreachables) == 0:
+        return None
 
-    conclude(message='scrubdown is recommended',
-             supplement='Run a scrubdown using `git doctor scrub`.')
+    return Diagnosis(message='scrubdown is recommended',
+                     supplement='Run a scrubdown using `git doctor scrub`.',
+                     notes=unreachables)
 
 
-def examine_readme(verbose: bool=False):
+def examine_readme(verbose: bool=False, deadline: float=None, repo_path: str=None) -> Diagnosis:
     """ Examine and diagnose whether current repository contains a README. """
 
-    if contains_readme(verbose):
-        return
+    if contains_readme(verbose, deadline, repo_path):
+        return None
+
+    return Diagnosis(message='README not found',
+                     supplement='As per convention, a README-file should exist and be tracked at '
+                                'the root of the repository.',
+                     notes=[])
+
+
+def examine_acceleration_structures(verbose: bool=False, deadline: float=None,
+                                    is_shallow: bool=False, repo_path: str=None) -> Diagnosis:
+    """ Examine and diagnose whether current repository is missing any of the structures that git
+    uses to speed up traversals and lookups, or has any that are stale.
+
+    The structures are a commit-graph, a multi-pack-index and reachability bitmaps. Note that git
+    neither writes nor uses a commit-graph in a shallow clone; so it is not examined in that case.
+    """
 
-    conclude(message='README not found',
-             supplement='As per convention, a README-file should exist and be tracked at the '
-                        'root of the repository.')
+    notes = []
 
+    # the object database is located only once; every structure is found within it
+    objects_path = repo.objects_path(deadline, repo_path)
 
-def examine_unwanted_files(verbose: bool=False):
+    if not is_shallow:
+        has_commit_graph, ungraphed_references, graphed_references = find_ungraphed_references(
+            objects_path, verbose, deadline, repo_path)
+
+        ungraphed_commits = count_new_commits(ungraphed_references, graphed_references,
+                                              UNGRAPHED_COMMIT_LIMIT, verbose, deadline, repo_path)
+
+        if ungraphed_commits >= UNGRAPHED_COMMIT_LIMIT:
+            if not has_commit_graph:
+                notes.append(f'commit-graph is missing; history has at least {ungraphed_commits} '
+                             f'commits')
+            else:
+                notes.append(f'commit-graph is stale; it does not include at least '
+                             f'{ungraphed_commits} commits (e.g. of {ungraphed_references[0]})')
+
+    packs = find_packs(objects_path)
+
+    has_multi_pack_index, indexed_packs, is_indexed_bitmapped = find_indexed_packs(objects_path)
+
+    unindexed_packs = [pack for pack in packs if pack not in indexed_packs]
+
+    if not has_multi_pack_index and len(packs) > UNINDEXED_PACK_LIMIT:
+        notes.append(f'multi-pack-index is missing; objects are spread across {len(packs)} packs')
+    elif has_multi_pack_index and len(unindexed_packs) > UNINDEXED_PACK_LIMIT:
+        notes.append(f'multi-pack-index is stale; it does not include {len(unindexed_packs)} '
+                     f'of {len(packs)} packs')
+
+    object_counts = count_packed_objects(objects_path, packs)
+    object_count = sum(object_counts.values())
+
+    bitmapped_packs = find_bitmapped_packs(objects_path, packs, indexed_packs,
+                                           is_indexed_bitmapped)
+
+    unbitmapped_packs = [pack for pack in packs if pack not in bitmapped_packs]
+    unbitmapped_object_count = sum(object_counts[pack] for pack in unbitmapped_packs)
+
+    # counting fewer objects is fast regardless of any bitmap
+    if object_count >= BITMAP_OBJECT_LIMIT:
+        if len(bitmapped_packs) == 0:
+            notes.append(f'reachability bitmap is missing; packs include {object_count} objects')
+        elif unbitmapped_object_count > object_count * UNBITMAPPED_OBJECT_FRACTION:
+            notes.append(f'reachability bitmap is stale; it does not cover '
+                         f'{unbitmapped_object_count} of {object_count} objects')
+
+    if len(notes) == 0:
+        return None
+
+    return Diagnosis(message='acceleration structures are missing or stale',
+                     supplement='Traversing history and looking up objects is slower than it '
+                                'could be. Write or refresh these structures using '
+                                '`git doctor scrub --optimize`.',
+                     notes=notes)
+
+
+def examine_unwanted_files(verbose: bool=False, deadline: float=None, pathspecs: list=None,
+                           repo_path: str=None) -> Diagnosis:
     """ Examine and diagnose whether current repository tracks unwanted files. """
 
-    unwanted_files = find_unwanted_files(verbose)
+    unwanted_files = find_unwanted_files(verbose, deadline, pathspecs, repo_path)
 
     if len(unwanted_files) == 0:
-        return
+        return None
 
     sources = []
 
     if verbose:
-        sources = get_exclusion_sources(unwanted_files, verbose)
+        sources = get_exclusion_sources(unwanted_files, verbose, deadline, repo_path)
 
         assert len(sources) == len(unwanted_files)
 
+    notes = []
+
     for i, file in enumerate(unwanted_files):
         if verbose:
             source = sources[i]
             file = f'{file} ({source})'
 
-        note(file)
+        notes.append(file)
 
-    conclude(message='unwanted files are being tracked',
-             supplement='Remove unwanted files from being tracked using '
-                        '`git remove --cached <filename>`, or remove them completely (from the '
-                        'filesystem) using `git rm <filename>`.')
+    return Diagnosis(message='unwanted files are being tracked',
+                     supplement='Remove unwanted files from being tracked using '
+                                '`git remove --cached <filename>`, or remove them completely '
+                                '(from the filesystem) using `git rm <filename>`.',
+                     notes=notes)
 
 
-def examine_excluded_files(verbose: bool=False):
-    """ Examine and diagnose whether current repository has untracked .gitignore rules. """
+def examine_unwanted_history(verbose: bool=False, deadline: float=None, pathspecs: list=None,
+                             is_partial_clone: bool=False, is_shallow: bool=False,
+                             repo_path: str=None) -> Diagnosis:
+    """ Examine and diagnose whether the history of current repository contains unwanted files;
+    e.g. files that were committed by mistake, and later removed.
 
-    excluded_files = find_excluded_files(verbose)
+    Every file in history is matched against the current gitignore-rules, in a single pass. Only
+    files that match are kept track of; so memory use does not depend on the size of history.
 
-    if len(excluded_files) == 0:
-        return
+    In a partial clone, only the sizes of files found locally are counted. In a shallow clone,
+    only the history that it includes is examined.
+    """
+
+    rules = find_exclusion_rules(deadline, repo_path)
 
-    sources = get_exclusion_sources(excluded_files, verbose)
+    # the first commit, and every version (by object id), of each unwanted file
+    unwanted_files = {}
+
+    for commit, filepath, object_id in find_committed_files(verbose, deadline, pathspecs,
+                                                            repo_path):
+        if filepath not in unwanted_files:
+            if not rules.is_excluded(filepath):
+                continue
+
+            unwanted_files[filepath] = [commit, set()]
+
+        unwanted_file = unwanted_files[filepath]
+
+        # commits are newest first; so the last one seen is the first one
+        unwanted_file[0] = commit
+        unwanted_file[1].add(object_id)
+
+    if len(unwanted_files) == 0:
+        return None
 
-    assert len(sources) == len(excluded_files)
+    object_ids = sorted(set(object_id for commit, object_ids in unwanted_files.values()
+                            for object_id in object_ids))
+
+    if is_partial_clone:
+        # any version that is missing from a partial clone is left out
+        sizes = find_local_object_sizes(object_ids, verbose, deadline, repo_path)
+    else:
+        sizes = dict(zip(object_ids, find_object_sizes(object_ids, verbose, deadline, repo_path)))
+
+    # note that a file is only counted once per version, even if committed several times
+    unwanted_files = sorted(((filepath, commit,
+                              sum(sizes.get(object_id, 0) for object_id in object_ids),
+                              all(object_id in sizes for object_id in object_ids))
+                             for filepath, (commit, object_ids) in unwanted_files.items()),
+                            key=lambda unwanted_file: unwanted_file[2], reverse=True)
+
+    notes = []
+
+    for filepath, commit, size, is_size_known in unwanted_files:
+        size = pretty_size(size) if is_size_known else \
+            f'at least {pretty_size(size)}' if size > 0 else \
+            'size unknown'
+
+        notes.append(f'{filepath} ({size}; first committed in {commit[:7]})')
+
+    supplement = ('These files match a gitignore-rule, but were committed at some point; every '
+                  'clone of the repository includes them, even if they have since been removed. '
+                  'Consider whether to rewrite history to remove them completely; e.g. using '
+                  '`git filter-repo`.')
+
+    if is_shallow:
+        supplement += (' Note that only the history included in this shallow clone was examined; '
+                       'files might have been committed earlier than reported.')
+
+    return Diagnosis(message='unwanted files are part of history',
+                     supplement=supplement,
+                     notes=notes)
+
+
+def examine_excluded_files(verbose: bool=False, deadline: float=None, pathspecs: list=None,
+                           per_file: bool=False, repo_path: str=None) -> Diagnosis:
+    """ Examine and diagnose whether current repository has untracked .gitignore rules.
+
+    Unless per_file is True, directories in which every file is excluded by the same rule are
+    diagnosed as a whole, instead of diagnosing every file in it.
+    """
+
+    pending_files = find_excluded_files(verbose, deadline, pathspecs,
+                                        collapse_directories=not per_file,
+                                        repo_path=repo_path)
+
+    excluded_files = []
+    sources = []
+
+    while len(pending_files) > 0:
+        pending_sources = get_exclusion_sources(pending_files, verbose, deadline,
+                                                repo_path)
+
+        assert len(pending_sources) == len(pending_files)
+
+        expanded_files = []
+
+        for file, source in zip(pending_files, pending_sources):
+            if len(source) > 0:
+                excluded_files.append(file)
+                sources.append(source)
+            elif file.endswith('/'):
+                # every file in this directory is excluded, but not by a single rule (e.g. a
+                # directory of '*.log' files); so drill down until every file can be attributed
+                expanded_files.extend(find_directory_entries(file, deadline, repo_path))
+
+        pending_files = expanded_files
+
+    if len(excluded_files) == 0:
+        return None
 
     source_filepaths = [source.split(':')[0] for source in sources]
 
     tracked_source_filepaths = [source for source in set(source_filepaths)
-                                if is_file_tracked(source, verbose)]
+                                if is_file_tracked(source, verbose, deadline, repo_path)]
 
-    has_untracked_rules = False
+    notes = []
 
-    for i, file in enumerate(excluded_files):
+    for i, file in sorted(enumerate(excluded_files), key=lambda entry: entry[1]):
         source = sources[i]
         source_filepath = source_filepaths[i]
 
@@ -89,77 +334,533 @@ def examine_excluded_files(verbose: bool=False):
             # skip this exclusion
             continue
 
-        has_untracked_rules = True
-
         file = f'{file} ({source})'
 
-        note(file)
+        notes.append(file)
 
-    if not has_untracked_rules:
-        return
+    if len(notes) == 0:
+        return None
 
-    conclude(message='files are being excluded by untracked rules',
-             supplement='Consider whether any of these files should also be excluded by '
-                        'other contributors; if so, adding any applicable rules to a '
-                        'tracked .gitignore file would be preferable.')
+    return Diagnosis(message='files are being excluded by untracked rules',
+                     supplement='Consider whether any of these files should also be excluded by '
+                                'other contributors; if so, adding any applicable rules to a '
+                                'tracked .gitignore file would be preferable.',
+                     notes=notes)
 
 
-def examine_missing_tags(verbose: bool=False):
-    """ Examine and diagnose whether current repository has unpublished tags.
+def examine_missing_tags(remotes: list, verbose: bool=False, deadline: float=None,
+                         remote_timeout: float=None, repo_path: str=None) -> Diagnosis:
+    """ Examine and diagnose whether current repository has tags that are not present on remotes.
 
-    This examination assumes that current repository has a remote.
+    Remotes are queried concurrently; see query_remotes for details on remote_timeout.
     """
 
-    local_tags = find_local_tags(verbose)
-    remote_tags = find_remote_tags(verbose)
+    local_tags = find_local_tags(verbose, deadline, repo_path)
+    remote_tags = query_remotes(find_remote_tags, remotes, verbose, deadline, remote_timeout,
+                                repo_path)
 
-    missing_tags = [tag for tag in local_tags
-                    if tag not in remote_tags]
+    notes = []
 
-    if len(missing_tags) == 0:
-        return
+    for tag in local_tags:
+        missing_remotes = [remote for remote, tags in remote_tags.items() if tag not in tags]
+
+        if len(missing_remotes) == 0:
+            continue
+
+        # with only one remote, it goes without saying which remote the tag is missing from
+        notes.append(tag if len(remotes) == 1 else f'{tag} ({", ".join(missing_remotes)})')
+
+    if len(notes) == 0:
+        return None
+
+    return Diagnosis(message='local tags not present on remote',
+                     supplement='These tags should either be deleted using `git tag -d <tag>`, or '
+                                'synced to remote using `git push --tags`. Alternatively, to '
+                                'easily match remote, use `git tag -d $(git tag)` (deleting all '
+                                'local tags), followed by `git fetch --tags` (fetching all remote '
+                                'tags).',
+                     notes=notes)
+
+
+def examine_redundant_branches(remotes: list, verbose: bool=False, deadline: float=None,
+                               remote_timeout: float=None, repo_path: str=None) -> Diagnosis:
+    """ Examine and diagnose whether current repository has redundant branches; i.e. branches that
+    are already merged with the default branch of a remote.
+
+    Remotes are queried concurrently; see query_remotes for details on remote_timeout.
+    """
+
+    merged_branches = query_remotes(find_merged_branches, remotes, verbose, deadline,
+                                    remote_timeout, repo_path)
+
+    notes = []
+
+    for remote, (redundant_branches, default_branch) in merged_branches.items():
+        notes.extend(branch if len(remotes) == 1 else f'{branch} ({default_branch})'
+                     for branch in redundant_branches)
+
+    if len(notes) == 0:
+        return None
+
+    if len(remotes) == 1:
+        redundant_branches, default_branch = merged_branches[remotes[0]]
+
+        message = f'redundant branches; already merged with \'{default_branch}\''
+    else:
+        message = 'redundant branches; already merged with the default branch of a remote'
+
+    return Diagnosis(message=message,
+                     supplement='These branches should be deleted (both locally and remote) '
+                                'unless they will continue to be used and are intentionally '
+                                'long-running.',
+                     notes=notes)
+
+
+def examine_staged_unwanted_files(staged_files: list, verbose: bool=False,
+                                  deadline: float=None, repo_path: str=None) -> Diagnosis:
+    """ Examine and diagnose whether any files staged for commit are unwanted. """
+
+    filepaths = [filepath for filepath, object_id in staged_files]
+
+    sources = get_exclusion_sources(filepaths, verbose, deadline, repo_path)
+
+    notes = [f'{filepath} ({source})' for filepath, source in zip(filepaths, sources)
+             if len(source) > 0]
+
+    if len(notes) == 0:
+        return None
+
+    return Diagnosis(message='unwanted files are staged for commit',
+                     supplement='Unstage unwanted files using `git restore --staged <filename>`.',
+                     notes=notes)
+
+
+def examine_staged_large_files(staged_files: list, size_limit: int=STAGED_SIZE_LIMIT,
+                               verbose: bool=False, deadline: float=None,
+                               repo_path: str=None, helper: command.Helper=None) -> Diagnosis:
+    """ Examine and diagnose whether any files staged for commit are larger than a size limit. """
+
+    object_ids = [object_id for filepath, object_id in staged_files]
+
+    sizes = find_object_sizes(object_ids, verbose, deadline, repo_path, helper)
 
-    for tag in missing_tags:
-        note(tag)
+    notes = [f'{filepath} ({pretty_size(size)})' for (filepath, object_id), size
+             in zip(staged_files, sizes) if size > size_limit]
 
-    conclude(message='local tags not present on remote',
-             supplement='These tags should either be deleted using `git tag -d <tag>`, or '
-                        'synced to remote using `git push --tags`. Alternatively, to '
-                        'easily match remote, use `git tag -d $(git tag)` (deleting all '
-                        'local tags), followed by `git fetch --tags` (fetching all remote '
-                        'tags).')
+    if len(notes) == 0:
+        return None
 
+    return Diagnosis(message=f'files larger than {pretty_size(size_limit)} are staged for commit',
+                     supplement='Once committed, large files remain in the history of the '
+                                'repository (making every clone larger) even if later removed. '
+                                'Consider whether these files should be tracked at all, or '
+                                'tracked using an extension such as Git LFS.',
+                     notes=notes)
 
-def examine_redundant_branches(remote_branch: str, verbose: bool=False):
-    """ Examine and diagnose whether current repository has redundant branches.
 
-    This examination assumes that current repository has a remote.
+def examine_staged_exclusion_rules(staged_files: list, verbose: bool=False,
+                                   deadline: float=None, repo_path: str=None) -> Diagnosis:
+    """ Examine and diagnose whether any .gitignore rules staged for commit exclude files that are
+    already tracked.
     """
 
-    redundant_branches, default_branch = find_merged_branches(remote_branch, verbose)
+    notes = []
+
+    for filepath, object_id in staged_files:
+        if posixpath.basename(filepath) != '.gitignore':
+            continue
+
+        rules, added_rules = find_staged_rules(filepath, object_id, verbose, deadline, repo_path)
+
+        if len(added_rules) == 0:
+            continue
+
+        # rules only apply to files at or below the directory of the .gitignore file
+        directory = posixpath.dirname(filepath)
+
+        # only files that an added rule could exclude are considered, and matched against the
+        # staged rules of the file; a later rule (e.g. a negation) takes precedence, as with git
+        matcher = ignore.Matcher({directory: rules})
+
+        for file in find_tracked_candidates(added_rules, directory, verbose, deadline, repo_path):
+            rule = matcher.explain(file)
+
+            if rule is not None and rule in added_rules:
+                notes.append(f'{file} ({rule.source})')
+
+    if len(notes) == 0:
+        return None
+
+    return Diagnosis(message='staged rules exclude tracked files',
+                     supplement='These files are tracked, but are excluded by rules added to a '
+                                '.gitignore file. Either remove them from being tracked using '
+                                '`git rm --cached <filename>`, or revise the rules.',
+                     notes=notes)
+
+
+def describe_error(error: Exception) -> str:
+    """ Return a short description of an error that caused an examination to fail. """
+
+    if isinstance(error, subprocess.CalledProcessError):
+        cmd = ' '.join(error.cmd) if isinstance(error.cmd, list) else error.cmd
+
+        return f'`{cmd}` failed with exit status {error.returncode}'
+
+    # note that some errors have no message; e.g. a failed assertion
+    return str(error) or type(error).__name__
+
+
+def present(diagnosis: Diagnosis):
+    """ Emit the notes and conclusion of a diagnosis. """
+
+    for defect in diagnosis.notes:
+        note(defect)
+
+    conclude(diagnosis.message, diagnosis.supplement)
+
+
+def diagnose(verbose: bool=False, deadline: float=None, use_cache: bool=False,
+             pathspecs: list=None, per_file: bool=False, checks: list=None, remotes: list=None,
+             remote_timeout: float=None, repo_path: str=None, results: dict=None):
+    """ Run examinations on current repository, and yield the outcome of each as it completes.
+
+    Examinations are run in order of increasing cost; i.e. cheaper examinations first.
+
+    If a deadline is provided (see command.deadline_from), each examination gets an equal share of
+    the time left when it starts; any examination that has not completed when its share runs out
+    is cut short, and any examinations remaining when the deadline passes are skipped. So a single
+    examination that hangs (e.g. on an unreachable remote) does not use up the entire budget.
+
+    If use_cache is True, reuse the results of previous examinations whose inputs have not changed
+    since, and persist the results of any examinations that had to be run again.
+
+    If any pathspecs (relative to the root of the repository) are provided, examinations of files
+    are restricted to files matching those.
+
+    If per_file is True, excluded files are diagnosed individually, instead of by directory.
+
+    If any checks are provided, only run examinations by those names (see EXAMINATIONS). Note that
+    examinations that do not apply (e.g. examinations of remotes when there are none) never run.
+
+    Only objects found locally are examined; objects missing from a partial clone are never fetched.
+    So in a partial clone that is missing trees (e.g. cloned using --filter=tree:0), history is not
+    examined at all; its examination is unavailable (see UNAVAILABLE).
+
+    If any remotes are provided (by name), only examine those; otherwise examine every remote.
+    If a remote_timeout (in seconds) is provided, examinations of remotes fail if any remote has
+    not responded within that time (see examine.query_remotes).
+
+    If results are provided (see cache.load), they are used as cache instead of loading the
+    persisted cache; e.g. to keep the cache in memory between examinations. Either way, the cache
+    is updated and persisted.
+    """
+
+    # imported on use; examining staged changes does not involve the cache, and should start fast
+    from doctor import cache
+
+    if results is None:
+        results = cache.load(repo_path) if use_cache else {}
+
+    # shared by several examinations; note that the state of an input is only determined once
+    # per input, as identified by the input itself (see cache.fingerprint)
+    exclusion_rules = partial(cache.exclusion_rules, results)
+
+    # examinations only ever use the objects found locally; any object missing from a partial
+    # clone (or history cut off from a shallow clone) would otherwise be fetched on demand
+    partial_clone_filters = repo.partial_clone_filters(repo_path=repo_path)
+
+    is_partial_clone = len(partial_clone_filters) > 0
+    is_shallow = repo.is_shallow(repo_path=repo_path)
+
+    # history can only be traversed if no trees are missing; i.e. if only blobs were filtered
+    has_every_tree = all(object_filter is not None and object_filter.startswith('blob:')
+                         for object_filter in partial_clone_filters.values())
+
+    # each examination is listed along with the inputs that it depends on; any options that affect
+    # the result are included as well (verbosity, for example, adds the source of exclusions)
+    # note that an examination without inputs always runs
+    examinations = [
+        ('readme', examine_readme,
+         [repo.index_checksum]),
+        # these structures are not reflected by the state of any other input, but examining them
+        # only involves reading a few files; so this examination always runs
+        ('acceleration-structures', partial(examine_acceleration_structures,
+                                            is_shallow=is_shallow),
+         []),
+        ('unwanted-files', partial(examine_unwanted_files, pathspecs=pathspecs),
+         [repo.index_checksum, exclusion_rules, verbose, pathspecs]),
+        # excluded files depend on every untracked file in the work tree, which is as costly to
+        # fingerprint as to examine; so this examination always runs
+        ('excluded-files', partial(examine_excluded_files, pathspecs=pathspecs, per_file=per_file),
+         [])
+    ]
+
+    if remotes is None:
+        remotes = repo.remotes(repo_path=repo_path)
+
+    if len(remotes) > 0:
+        # these examinations query the remotes and can be slow depending on network conditions
+        # note that changes on a remote are only seen once fetched (see repo.remote_state)
+        remote_inputs = [repo.refs_state, remotes] + [partial(repo.remote_state, remote)
+                                                      for remote in remotes]
+
+        examinations.extend([
+            # tags are queried from each remote, and pushing tags changes neither local references
+            # nor the last fetched state of a remote; so this examination always runs
+            ('missing-tags', partial(examine_missing_tags, remotes,
+                                     remote_timeout=remote_timeout),
+             []),
+            ('redundant-branches', partial(examine_redundant_branches, remotes,
+                                           remote_timeout=remote_timeout),
+             remote_inputs)
+        ])
+
+    # these are typically the most costly examinations, as they involve checking every object,
+    # and every change in history, respectively
+    examinations.append(
+        ('scrubdown', partial(examine_scrubdown, is_partial_clone=is_partial_clone),
+         [repo.index_checksum, repo.refs_state, repo.objects_state, is_partial_clone]))
+
+    # examinations that can not run are listed along with the reason why
+    unavailable_examinations = []
+
+    if has_every_tree:
+        examinations.append(
+            ('unwanted-history', partial(examine_unwanted_history, pathspecs=pathspecs,
+                                         is_partial_clone=is_partial_clone, is_shallow=is_shallow),
+             [repo.refs_state, exclusion_rules, pathspecs,
+              is_partial_clone, is_shallow]))
+    else:
+        unavailable_examinations.append(
+            ('unwanted-history', 'trees are missing from this partial clone'))
+
+    if checks is not None:
+        examinations = [examination for examination in examinations
+                        if examination[0] in checks]
+        unavailable_examinations = [examination for examination in unavailable_examinations
+                                    if examination[0] in checks]
+
+    # the state of inputs shared by several examinations is only determined once
+    values = {}
+
+    for index, (name, examination, inputs) in enumerate(examinations):
+        if command.time_left(deadline) == 0:
+            yield Outcome(name, SKIPPED, None)
+
+            continue
+
+        # any time not used by an examination is shared by the examinations that remain
+        share = command.share_of(deadline, len(examinations) - index)
+
+        try:
+            fingerprint = None
+
+            if use_cache and len(inputs) > 0:
+                fingerprint = cache.fingerprint(inputs, values, share, repo_path)
+
+                is_cached, result = cache.lookup(results, name, fingerprint)
+
+                if is_cached:
+                    diagnosis = Diagnosis(*result) if result is not None else None
+
+                    yield Outcome(name, DEFECTIVE if diagnosis is not None else HEALTHY, diagnosis)
+
+                    continue
+
+            diagnosis = examination(verbose=verbose, deadline=share, repo_path=repo_path)
+        except subprocess.TimeoutExpired:
+            yield Outcome(name, CUT_SHORT, None)
+
+            continue
+        except (subprocess.CalledProcessError, OSError, RemoteError) as error:
+            # one examination failing does not prevent any other examination from running
+            yield Outcome(name, FAILED, None, describe_error(error))
+
+            continue
+
+        if fingerprint is not None:
+            cache.remember(results, name, fingerprint, diagnosis)
+
+        yield Outcome(name, DEFECTIVE if diagnosis is not None else HEALTHY, diagnosis)
+
+    for name, reason in unavailable_examinations:
+        yield Outcome(name, UNAVAILABLE, None, reason)
+
+    if use_cache:
+        cache.store(results, repo_path)
+
+
+def diagnose_staged(verbose: bool=False, deadline: float=None, size_limit: int=STAGED_SIZE_LIMIT,
+                    checks: list=None, repo_path: str=None, helper: command.Helper=None):
+    """ Run examinations on changes staged for commit in current repository, and yield the outcome
+    of each as it completes.
+
+    Only staged files are examined; so unlike diagnose, the cost does not depend on the size of the
+    repository. Any files larger than size_limit (in bytes) are diagnosed as large.
+
+    If a helper is provided (see examine.find_object_sizes), it is used to find the size of
+    staged files.
+
+    See diagnose for details on any other options. Note that checks must be any of
+    STAGED_EXAMINATIONS.
+    """
+
+    names = [name for name in STAGED_EXAMINATIONS
+             if checks is None or name in checks]
+
+    try:
+        # every examination works on the same staged files, so they are only found once
+        staged_files = find_staged_files(verbose, deadline, repo_path)
+    except subprocess.TimeoutExpired:
+        for name in names:
+            yield Outcome(name, CUT_SHORT, None)
 
-    if len(redundant_branches) == 0:
         return
+    except (subprocess.CalledProcessError, OSError) as error:
+        for name in names:
+            yield Outcome(name, FAILED, None, describe_error(error))
+
+        return
+
+    examinations = {
+        'staged-unwanted-files': examine_staged_unwanted_files,
+        'staged-large-files': partial(examine_staged_large_files, size_limit=size_limit,
+                                      helper=helper),
+        'staged-exclusion-rules': examine_staged_exclusion_rules
+    }
+
+    for index, name in enumerate(names):
+        if command.time_left(deadline) == 0:
+            yield Outcome(name, SKIPPED, None)
+
+            continue
+
+        share = command.share_of(deadline, len(names) - index)
+
+        try:
+            diagnosis = examinations[name](staged_files, verbose=verbose, deadline=share,
+                                           repo_path=repo_path)
+        except subprocess.TimeoutExpired:
+            yield Outcome(name, CUT_SHORT, None)
+
+            continue
+        except (subprocess.CalledProcessError, OSError) as error:
+            yield Outcome(name, FAILED, None, describe_error(error))
+
+            continue
+
+        yield Outcome(name, DEFECTIVE if diagnosis is not None else HEALTHY, diagnosis)
+
+
+def check_cached_eligibility(results: dict, verbose: bool=False, deadline: float=None,
+                             repo_path: str=None) -> (bool, list):
+    """ Determine whether current repository is eligible for examination, along with a list of
+    any issues found (see examine.check_eligibility).
+
+    The check is skipped if the repository was found eligible before and has not changed since.
+    Whether it was is kept in results (see cache.load), and persisted along with them.
+    """
+
+    from doctor import cache
+
+    fingerprint = cache.eligibility(deadline, repo_path)
+
+    if results.get('eligibility') == fingerprint:
+        return True, []
+
+    is_eligible, issues = check_eligibility(verbose, deadline, repo_path)
+
+    if is_eligible:
+        results['eligibility'] = fingerprint
+
+    return is_eligible, issues
+
+
+def find_unknown_checks(checks: list=None, staged: bool=False) -> list:
+    """ Return a list of any checks that are not names of examinations (see EXAMINATIONS), or of
+    staged examinations if staged is True (see STAGED_EXAMINATIONS).
+    """
+
+    if checks is None:
+        return []
+
+    return [check for check in checks
+            if check not in (EXAMINATIONS if not staged else STAGED_EXAMINATIONS)]
+
+
+def find_unknown_remotes(remotes: list=None, repo_path: str=None) -> list:
+    """ Return a list of any remotes that are not remotes of current repository. """
+
+    if remotes is None:
+        return []
+
+    known_remotes = repo.remotes(repo_path=repo_path)
+
+    return [remote for remote in remotes if remote not in known_remotes]
+
+
+def checkup(path: str, checks: list=None, budget: float=None, use_cache: bool=False,
+            pathspecs: list=None, per_file: bool=False, staged: bool=False,
+            size_limit: int=STAGED_SIZE_LIMIT, remotes: list=None,
+            remote_timeout: float=None) -> list:
+    """ Examine the repository found at a path and return a list of outcomes (see Outcome).
+
+    The path can be any path inside the work tree of the repository. Any pathspecs are relative to
+    the path. If staged is True, only examine changes staged for commit (see diagnose_staged). See
+    diagnose for details on any other options.
+
+    If the repository is not eligible for examination, return only the outcome of the eligibility
+    check; its diagnosis lists any issues found. Note that the eligibility check is not run when
+    only examining staged changes; as it involves checking every object in the repository.
+
+    Raise ValueError if the path is not inside a work tree, or if any check or remote is not
+    recognized.
+    """
+
+    unknown_checks = find_unknown_checks(checks, staged)
+
+    if len(unknown_checks) > 0:
+        raise ValueError(f'unknown examinations: {", ".join(unknown_checks)}')
+
+    if not repo.exists(path):
+        raise ValueError(f'not inside a work tree: {path}')
+
+    unknown_remotes = find_unknown_remotes(remotes, path)
+
+    if len(unknown_remotes) > 0:
+        raise ValueError(f'unknown remotes: {", ".join(unknown_remotes)}')
+
+    deadline = command.deadline_from(budget)
+
+    if staged:
+        return list(diagnose_staged(deadline=deadline, size_limit=size_limit, checks=checks,
+                                    repo_path=path))
 
-    for branch in redundant_branches:
-        note(branch)
+    results = None
 
-    conclude(message=f'redundant branches; already merged with \'{default_branch}\'',
-             supplement='These branches should be deleted (both locally and remote) unless '
-                        'they will continue to be used and are intentionally long-running.')
+    try:
+        if use_cache:
+            from doctor import cache
 
+            results = cache.load(path)
 
-def diagnose(verbose: bool=False):
-    """ Run all examinations on current repository. """
+            is_eligible, issues = check_cached_eligibility(results, deadline=deadline,
+                                                           repo_path=path)
+        else:
+            is_eligible, issues = check_eligibility(deadline=deadline, repo_path=path)
+    except subprocess.TimeoutExpired:
+        return [Outcome('eligibility', CUT_SHORT, None)]
 
-    examine_scrubdown(verbose)
-    examine_readme(verbose)
+    if not is_eligible:
+        diagnosis = Diagnosis(message='repository is not eligible for examination',
+                              supplement=None,
+                              notes=issues)
 
-    has_remote, default_branch = repo.has_remote()
+        return [Outcome('eligibility', DEFECTIVE, diagnosis)]
 
-    if has_remote:
-        examine_missing_tags(verbose)
-        examine_redundant_branches(default_branch, verbose)
+    if pathspecs is not None:
+        pathspecs = repo.pathspecs_from_root(pathspecs, repo_path=path)
 
-    examine_excluded_files(verbose)
-    examine_unwanted_files(verbose)
+    return list(diagnose(deadline=deadline, use_cache=use_cache, pathspecs=pathspecs,
+                         per_file=per_file, checks=checks, remotes=remotes,
+                         remote_timeout=remote_timeout, repo_path=path, results=results))
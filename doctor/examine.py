@@ -2,14 +2,30 @@
 
 """
 Provides functions for examining and discovering defects in the current repository.
+
+Examinations that are given a deadline (see command.deadline_from) raise subprocess.TimeoutExpired
+if they could not be completed before the deadline passed.
+
+Examinations that are given a repo_path examine the repository found at that path instead of the
+repository found at the current working directory.
 """
 
+import os
+import re
+import posixpath
 import subprocess
 
-from doctor import command, repo
+from doctor import command, repo, structures, ignore
+
+
+class RemoteError(Exception):
+    """ Raised when remotes could not be queried; e.g. because none of them could be reached, or
+    because a remote did not respond within its timeout.
+    """
 
 
-def check_eligibility(verbose: bool=False) -> (bool, list):
+def check_eligibility(verbose: bool=False, deadline: float=None,
+                      repo_path: str=None) -> (bool, list):
     """ Return True if repository is eligible for examination, False otherwise.
 
     Determine eligibility by whether or not a `git fsck` check passes and produces no issues.
@@ -20,8 +36,10 @@ def check_eligibility(verbose: bool=False) -> (bool, list):
     if verbose:
         command.display(cmd)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
         stdout=subprocess.DEVNULL,
         stderr=subprocess.PIPE)
 
@@ -32,7 +50,8 @@ def check_eligibility(verbose: bool=False) -> (bool, list):
     return is_eligible, issues
 
 
-def find_unreachable_objects(verbose) -> list:
+def find_unreachable_objects(verbose: bool=False, deadline: float=None,
+                             repo_path: str=None) -> list:
     """ Return a list of unreachable objects eligible for a scrubdown. """
 
     cmd = 'git fsck --unreachable'
@@ -40,8 +59,10 @@ def find_unreachable_objects(verbose) -> list:
     if verbose:
         command.display(cmd)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL)
 
@@ -50,75 +71,234 @@ def find_unreachable_objects(verbose) -> list:
     return unreachables
 
 
-def find_unwanted_files(verbose: bool=False) -> list:
+def find_promised_objects(object_ids: list, deadline: float=None, repo_path: str=None) -> set:
+    """ Return the set of objects (by id) that were fetched from a promisor remote into a partial
+    clone (see repo.partial_clone_filters).
+    """
+
+    paths = structures.promisor_pack_index_paths(repo.objects_path(deadline, repo_path))
+
+    return structures.find_packed_objects(paths, object_ids)
+
+
+def find_unwanted_files(verbose: bool=False, deadline: float=None, pathspecs: list=None,
+                        repo_path: str=None) -> list:
     """ Return a list of tracked files that match a gitignore-rule.
 
     Check against any viable gitignore location; e.g. any of the following:
         .git/info/exclude
         .gitignore in each directory (at or below current working directory)
         user’s global exclusion file
+
+    If any pathspecs (relative to the root of the repository) are provided, only files matching
+    those are considered.
     """
 
-    cmd = 'git ls-files --ignored --exclude-standard'
+    cmd = command.get_argv('git ls-files -z --cached --ignored --exclude-standard', pathspecs)
 
     if verbose:
         command.display(cmd)
 
     # we need to set the current working directory as the root of the repository
     # otherwise we might miss .gitignore files located in directories above
-    root_path = repo.absolute_path()
+    root_path = repo.absolute_path(deadline, repo_path)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    result = command.run(
+        cmd,
+        deadline=deadline,
         cwd=root_path,
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL)
 
-    files = result.stdout.decode('utf-8').splitlines()
+    files = result.stdout.decode('utf-8').split('\0')[:-1]
 
     return files
 
 
-def find_excluded_files(verbose: bool=False) -> list:
-    """ Return a list of both tracked and untracked files that match a gitignore-rule. """
+def find_exclusion_rules(deadline: float=None, repo_path: str=None) -> ignore.Matcher:
+    """ Return the gitignore-rules of current repository, compiled for matching any path (relative
+    to the root of the repository) without involving git.
+
+    Only rules in .gitignore files of directories that contain tracked files are included (along
+    with .git/info/exclude and the user's global exclusion file).
+    """
+
+    root_path = repo.absolute_path(deadline, repo_path)
+
+    directories = repo.tracked_directories(deadline, repo_path)
+
+    global_filepath, local_filepath, *filepaths = repo.exclusion_filepaths(directories, deadline,
+                                                                           repo_path)
 
-    cmd = 'git ls-files --others --ignored --exclude-standard'
+    def read(filepath: str) -> str:
+        try:
+            with open(filepath, encoding='utf-8', errors='replace') as file:
+                return file.read()
+        except OSError:
+            # the file does not exist (or can not be read, in which case git ignores it as well)
+            return ''
+
+    # rules that apply to the entire repository, in order of increasing precedence
+    rules = {'': (ignore.parse(read(global_filepath), global_filepath) +
+                  ignore.parse(read(local_filepath), os.path.relpath(local_filepath, root_path)))}
+
+    for directory, filepath in zip(directories, filepaths):
+        source = posixpath.join(directory, '.gitignore')
+
+        rules[directory] = rules.get(directory, []) + ignore.parse(read(filepath), source)
+
+    return ignore.Matcher(rules)
+
+
+def find_committed_files(verbose: bool=False, deadline: float=None, pathspecs: list=None,
+                         repo_path: str=None):
+    """ Yield each file committed to the history of current repository, as a commit (by id), a path
+    (relative to the root of the repository) and an object id.
+
+    A file is yielded for every commit that added or modified it; commits are in reverse
+    chronological order (i.e. newest first), and merges are not included.
+
+    If any pathspecs (relative to the root of the repository) are provided, only files matching
+    those are yielded.
+    """
+
+    cmd = command.get_argv('git log --all --raw -z --no-renames --no-abbrev --diff-filter=AMT '
+                           '--no-textconv --no-ext-diff --format=%H', pathspecs)
 
     if verbose:
         command.display(cmd)
 
-    root_path = repo.absolute_path()
+    commit = None
+    entry = None
+
+    # each commit is followed by an entry for each file it changed, of which each is followed by a
+    # path; e.g. 'a1b2c3', ':000000 100644 0000000 d4e5f6 A', 'README.md'
+    for record in command.records(cmd, deadline=deadline,
+                                  cwd=repo.absolute_path(deadline, repo_path),
+                                  stderr=subprocess.DEVNULL):
+        record = record.decode('utf-8', errors='replace')
+
+        if entry is not None:
+            mode, object_id = entry
+            entry = None
+
+            # a submodule is a commit in another repository, not a file
+            if mode != '160000':
+                yield commit, record, object_id
+
+            continue
+
+        record = record.lstrip('\n')
+
+        if record.startswith(':'):
+            # only the mode and object id after the change are of interest
+            entry = record.split(' ')[1:4:2]
+        elif len(record) > 0:
+            commit = record
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+
+def find_excluded_files(verbose: bool=False, deadline: float=None, pathspecs: list=None,
+                        collapse_directories: bool=False, repo_path: str=None) -> list:
+    """ Return a list of both tracked and untracked files that match a gitignore-rule.
+
+    If any pathspecs (relative to the root of the repository) are provided, only files matching
+    those are considered; any directories not matching are not traversed at all.
+
+    If collapse_directories is True, any directory in which every file is excluded is listed as a
+    whole (with a trailing slash) instead of listing every file in it; e.g. 'node_modules/'.
+    """
+
+    cmd = 'git ls-files -z --others --ignored --exclude-standard'
+
+    if collapse_directories:
+        cmd += ' --directory'
+
+    cmd = command.get_argv(cmd, pathspecs)
+
+    if verbose:
+        command.display(cmd)
+
+    root_path = repo.absolute_path(deadline, repo_path)
+
+    result = command.run(
+        cmd,
+        deadline=deadline,
         cwd=root_path,
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL)
 
-    files = result.stdout.decode('utf-8').splitlines()
+    files = result.stdout.decode('utf-8').split('\0')[:-1]
+
+    if collapse_directories:
+        # files inside a collapsed directory are sometimes listed as well; e.g. when no single rule
+        # excludes the directory itself (note that --no-empty-directory avoids this, but also
+        # omits excluded files in directories that are not excluded as a whole)
+        collapsed_files = []
+
+        for file in sorted(files):
+            if len(collapsed_files) > 0:
+                previous_file = collapsed_files[-1]
+
+                if previous_file.endswith('/') and file.startswith(previous_file):
+                    continue
+
+            collapsed_files.append(file)
+
+        files = collapsed_files
 
     return files
 
 
-def is_file_tracked(filepath: str, verbose: bool=False) -> bool:
-    """ Return True if file is tracked in current repository, False otherwise. """
+def find_directory_entries(directory: str, deadline: float=None, repo_path: str=None) -> list:
+    """ Return a list of files and directories immediately inside a directory.
+
+    The path of the directory must be relative to the root of the repository, as are the resulting
+    paths. Directories are listed with a trailing slash.
+    """
+
+    root_path = repo.absolute_path(deadline, repo_path)
+
+    entries = []
+
+    with os.scandir(os.path.join(root_path, directory)) as directory_entries:
+        for entry in directory_entries:
+            path = posixpath.join(directory, entry.name)
+
+            if entry.is_dir(follow_symlinks=False):
+                path += '/'
 
-    cmd = f'git ls-files --error-unmatch {filepath}'
+            entries.append(path)
+
+    return sorted(entries)
+
+
+def is_file_tracked(filepath: str, verbose: bool=False, deadline: float=None,
+                    repo_path: str=None) -> bool:
+    """ Return True if file is tracked in current repository, False otherwise.
+
+    The path of the file must be relative to the root of the repository.
+    """
+
+    cmd = command.get_argv('git ls-files --error-unmatch', [filepath])
 
     if verbose:
         command.display(cmd)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    root_path = repo.absolute_path(deadline, repo_path)
+
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=root_path,
         stdout=subprocess.DEVNULL,
         stderr=subprocess.DEVNULL)
 
     return result.returncode == 0
 
 
-def find_local_tags(verbose: bool=False) -> list:
+def find_local_tags(verbose: bool=False, deadline: float=None, repo_path: str=None) -> list:
     """ Return a list of local tags. """
 
     cmd = 'git tag --list'
@@ -126,8 +306,10 @@ def find_local_tags(verbose: bool=False) -> list:
     if verbose:
         command.display(cmd)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL)
@@ -137,74 +319,370 @@ def find_local_tags(verbose: bool=False) -> list:
     return tags
 
 
-def find_remote_tags(verbose: bool=False) -> list:
-    """ Return a list of remote tags. """
+def find_remote_tags(remote: str, verbose: bool=False, deadline: float=None,
+                     repo_path: str=None) -> list:
+    """ Return a list of tags on a remote. """
 
-    cmd = 'git ls-remote --tags --quiet'
+    cmd = ['git', 'ls-remote', '--tags', '--quiet', remote]
 
     if verbose:
         command.display(cmd)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL)
 
     tags = result.stdout.decode('utf-8').splitlines()
 
-    # assume format like '<commit>    refs/tags/<tag>'
-    tags = [tag.split('/')[-1] for tag in tags]
+    # assume format like '<object>\trefs/tags/<tag>'
+    tags = [tag.split('\t', 1)[-1][len('refs/tags/'):] for tag in tags]
+    # an annotated tag is listed a second time, peeled to the object it tags; e.g. '<tag>^{}'
+    tags = [tag for tag in tags if not tag.endswith('^{}')]
 
     return tags
 
 
-def get_exclusion_sources(filepaths: list, verbose: bool) -> list:
-    """ Determine which gitignore-rule and file is the source of a file being excluded.
+def query_remotes(query, remotes: list, verbose: bool=False, deadline: float=None,
+                  remote_timeout: float=None, repo_path: str=None) -> dict:
+    """ Run a query on each remote concurrently, and return a dictionary of the result of each
+    remote (by name).
+
+    A query is a function that is given a remote along with verbose, deadline and repo_path; e.g.
+    find_remote_tags.
+
+    If a remote_timeout (in seconds) is provided, the query of a remote is cut short if it has not
+    completed before that many seconds have passed (or before the deadline passes, if earlier).
 
-    Return a list that is synchronous and identical in length to the provided filepaths.
+    Raise subprocess.TimeoutExpired if the query of any remote was cut short by the deadline, or
+    RemoteError (naming the remotes) if cut short by the remote_timeout, or if the query of any
+    remote failed (e.g. because the remote no longer exists); as the result would otherwise be
+    incomplete.
     """
 
-    # to avoid exceeding max argument/commandline length, we split input into chunks if necessary
-    # the chunk size is completely arbitrary, but larger is better (fewer git executions)
-    chunk_size = 1024
+    # imported on use; it takes a while to import, and most invocations never query remotes
+    from concurrent.futures import ThreadPoolExecutor
+
+    remote_deadline = command.deadline_from(remote_timeout)
+
+    if deadline is not None and (remote_deadline is None or deadline < remote_deadline):
+        remote_deadline = deadline
+
+    # note that each query mostly waits on the network, so each remote is queried in its own thread
+    with ThreadPoolExecutor(max_workers=max(len(remotes), 1)) as executor:
+        futures = [(remote, executor.submit(query, remote, verbose=verbose,
+                                            deadline=remote_deadline, repo_path=repo_path))
+                   for remote in remotes]
+
+    results = {}
+    failed_remotes = []
+    unresponsive_remotes = []
+
+    for remote, future in futures:
+        try:
+            results[remote] = future.result()
+        except subprocess.TimeoutExpired as error:
+            if command.time_left(deadline) == 0:
+                # the deadline passed; not the fault of any remote
+                raise error
+
+            unresponsive_remotes.append(remote)
+        except subprocess.CalledProcessError:
+            failed_remotes.append(remote)
 
-    if len(filepaths) > chunk_size:
-        chunks = [filepaths[i:i + chunk_size] for i in range(0, len(filepaths), chunk_size)]
+    reasons = []
 
-        sources = []
+    if len(failed_remotes) > 0:
+        reasons.append(f'could not query {", ".join(failed_remotes)}')
 
-        for chunk in chunks:
-            sources.extend(get_exclusion_sources(chunk, verbose))
-            # disable verbosity after first execution
-            verbose = False
+    if len(unresponsive_remotes) > 0:
+        reasons.append(f'no response within {remote_timeout:g}s from '
+                       f'{", ".join(unresponsive_remotes)}')
+
+    if len(reasons) > 0:
+        raise RemoteError('; '.join(reasons))
+
+    return results
+
+
+def get_exclusion_sources(filepaths: list, verbose: bool, deadline: float=None,
+                          repo_path: str=None) -> list:
+    """ Determine which gitignore-rule and file is the source of a file being excluded.
+
+    The paths of the files must be relative to the root of the repository. Directories can be
+    provided as well (with a trailing slash), in which case the source is the rule excluding the
+    directory as a whole, if any.
+
+    Return a list that is synchronous and identical in length to the provided filepaths. The source
+    of a file that is not excluded (or a directory not excluded as a whole) is an empty string.
+    """
 
-        return sources
+    if len(filepaths) == 0:
+        return []
 
-    cmd = 'git check-ignore --no-index --verbose ...'
+    # paths are passed through stdin rather than as arguments; this avoids exceeding the max
+    # argument/commandline length, and only requires a single git execution no matter how many
+    cmd = 'git check-ignore --no-index --verbose --non-matching --stdin -z'
 
     if verbose:
         command.display(cmd)
 
-    cmd = cmd.replace('...', ' '.join(filepaths))
+    root_path = repo.absolute_path(deadline, repo_path)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        input=''.join(f'{filepath}\0' for filepath in filepaths).encode('utf-8'),
+        cwd=root_path,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL)
 
-    sources = result.stdout.decode('utf-8').splitlines()
+    # the format is <source> NUL <linenum> NUL <pattern> NUL <pathname> NUL
+    # (where each field except pathname is empty if not excluded)
+    fields = result.stdout.decode('utf-8').split('\0')[:-1]
 
-    assert len(sources) == len(filepaths)
+    assert len(fields) == len(filepaths) * 4
 
-    # the format is <source>:<linenum>:<pattern>\t<pathname>
     # resulting format is <source>:<linenum>
-    formatted_sources = [':'.join(source.split(':')[:2]) for source in sources]
+    formatted_sources = [f'{fields[i]}:{fields[i + 1]}' if len(fields[i]) > 0 else ''
+                         for i in range(0, len(fields), 4)]
 
     return formatted_sources
 
 
-def contains_readme(verbose: bool=False) -> bool:
+def find_staged_files(verbose: bool=False, deadline: float=None,
+                      repo_path: str=None) -> list:
+    """ Return a list of files that are staged for commit; i.e. added or modified in the index.
+
+    Each file is listed as a pair of its path (relative to the root of the repository) and the
+    object id of its staged content. Submodules are not listed.
+    """
+
+    cmd = 'git diff --cached --raw -z --no-abbrev --no-renames --diff-filter=AMT'
+
+    if verbose:
+        command.display(cmd)
+
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+
+    # the format is :<old mode> <new mode> <old object> <new object> <status> NUL <path> NUL
+    fields = result.stdout.decode('utf-8').split('\0')[:-1]
+
+    files = []
+
+    for i in range(0, len(fields), 2):
+        mode, object_id = fields[i].split(' ')[1:4:2]
+
+        if mode == '160000':
+            # skip submodules; the object is a commit in another repository
+            continue
+
+        files.append((fields[i + 1], object_id))
+
+    return files
+
+
+def find_object_sizes(object_ids: list, verbose: bool=False, deadline: float=None,
+                      repo_path: str=None, helper: command.Helper=None) -> list:
+    """ Return a list of the sizes (in bytes) of objects.
+
+    Return a list that is synchronous and identical in length to the provided object ids.
+
+    If a helper is provided (running `git cat-file --batch-check=%(objectsize)`), sizes are queried
+    from it instead of from a new process.
+    """
+
+    if len(object_ids) == 0:
+        return []
+
+    cmd = 'git cat-file --batch-check=%(objectsize)'
+
+    if verbose:
+        command.display(cmd)
+
+    if helper is not None:
+        lines = helper.query(object_ids, deadline=deadline)
+    else:
+        result = command.run(
+            cmd,
+            deadline=deadline,
+            input=''.join(f'{object_id}\n' for object_id in object_ids).encode('utf-8'),
+            cwd=repo_path,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+
+        lines = result.stdout.decode('utf-8').splitlines()
+
+    sizes = [int(size) for size in lines]
+
+    assert len(sizes) == len(object_ids)
+
+    return sizes
+
+
+def find_local_object_sizes(object_ids: list, verbose: bool=False, deadline: float=None,
+                            repo_path: str=None) -> dict:
+    """ Return a dictionary of the sizes (in bytes) of objects (by id).
+
+    Unlike find_object_sizes, only objects found locally are looked up, and any other object is
+    left out; i.e. objects missing from a partial clone are never fetched. Every object in the
+    repository is listed to determine this; so this is slower than looking up objects directly.
+    """
+
+    if len(object_ids) == 0:
+        return {}
+
+    cmd = ['git', 'cat-file', '--batch-all-objects', '--unordered',
+           '--batch-check=%(objectname) %(objectsize)']
+
+    if verbose:
+        command.display(cmd)
+
+    wanted_objects = set(object_ids)
+
+    sizes = {}
+
+    for record in command.records(cmd, separator=b'\n', deadline=deadline, cwd=repo_path,
+                                  stderr=subprocess.DEVNULL):
+        object_id, _, size = record.decode('utf-8').partition(' ')
+
+        if object_id in wanted_objects:
+            sizes[object_id] = int(size)
+
+    return sizes
+
+
+def find_staged_lines(filepath: str, verbose: bool=False, deadline: float=None,
+                      repo_path: str=None) -> list:
+    """ Return a list of line numbers of lines added to a file and staged for commit.
+
+    The path of the file must be relative to the root of the repository.
+    """
+
+    cmd = command.get_argv('git diff --cached --unified=0 --no-color --no-ext-diff', [filepath])
+
+    if verbose:
+        command.display(cmd)
+
+    root_path = repo.absolute_path(deadline, repo_path)
+
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=root_path,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+
+    hunks = result.stdout.decode('utf-8', errors='replace').splitlines()
+
+    lines = []
+
+    for hunk in hunks:
+        # the format is @@ -<start>[,<count>] +<start>[,<count>] @@; where only the latter range
+        # applies to the staged file (a count of 0 means that lines were only removed)
+        match = re.match(r'^@@ -\S+ \+(\d+)(?:,(\d+))? @@', hunk)
+
+        if match is None:
+            continue
+
+        start = int(match.group(1))
+        count = int(match.group(2)) if match.group(2) is not None else 1
+
+        lines.extend(range(start, start + count))
+
+    return lines
+
+
+def find_staged_rules(filepath: str, object_id: str, verbose: bool=False, deadline: float=None,
+                      repo_path: str=None) -> (list, list):
+    """ Return a list of the rules of a .gitignore file as staged for commit (see ignore.parse),
+    along with a list of the rules that were added.
+
+    The rules are read from the staged content (object_id) rather than the work tree; so line
+    numbers match those of the staged changes, even if the file has unstaged changes as well.
+    """
+
+    lines = find_staged_lines(filepath, verbose, deadline, repo_path)
+
+    if len(lines) == 0:
+        return [], []
+
+    cmd = ['git', 'cat-file', 'blob', object_id]
+
+    if verbose:
+        command.display(cmd)
+
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+
+    rules = ignore.parse(result.stdout.decode('utf-8', errors='replace'), filepath)
+
+    added_sources = set(f'{filepath}:{line}' for line in lines)
+
+    return rules, [rule for rule in rules if rule.source in added_sources]
+
+
+def find_tracked_candidates(rules: list, directory: str, verbose: bool=False,
+                            deadline: float=None, repo_path: str=None) -> list:
+    """ Return a list of tracked files that could be excluded by any of the rules of a .gitignore
+    file in a directory (relative to the root of the repository; the root itself is '').
+
+    Only files matching the patterns of the rules are listed, as pathspecs; so the cost depends on
+    the number of matching files rather than the size of the repository.
+    """
+
+    prefix = f'{directory}/' if len(directory) > 0 else ''
+
+    pathspecs = []
+
+    for rule in rules:
+        if rule.is_negated:
+            continue
+
+        glob = rule.glob if rule.is_anchored else f'**/{rule.glob}'
+
+        # a rule that matches a directory excludes every file inside it
+        pathspecs.append(f':(glob){prefix}{glob}/**')
+
+        if not rule.is_directory_only:
+            pathspecs.append(f':(glob){prefix}{glob}')
+
+    if len(pathspecs) == 0:
+        return []
+
+    cmd = command.get_argv('git ls-files -z --cached', pathspecs)
+
+    if verbose:
+        command.display(cmd)
+
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo.absolute_path(deadline, repo_path),
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+
+    return result.stdout.decode('utf-8').split('\0')[:-1]
+
+
+def contains_readme(verbose: bool=False, deadline: float=None, repo_path: str=None) -> bool:
     """ Return True if current repository tracks a README file at root level, False otherwise.
 
     Note that this check only applies to files tracked by the index; return True only if a README-
@@ -219,10 +697,11 @@ def contains_readme(verbose: bool=False) -> bool:
         command.display(cmd)
 
     # set the current working directory as root of the repository to perform search from top-level
-    root_path = repo.absolute_path()
+    root_path = repo.absolute_path(deadline, repo_path)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    result = command.run(
+        cmd,
+        deadline=deadline,
         cwd=root_path,
         check=True,
         stdout=subprocess.PIPE,
@@ -234,18 +713,28 @@ def contains_readme(verbose: bool=False) -> bool:
     return len(files) > 0
 
 
-def find_merged_branches(remote: str, verbose: bool) -> (list, str):
-    """ Return a list of branches that are merged with default branch on a remote. """
+def find_merged_branches(remote: str, verbose: bool=False, deadline: float=None,
+                         repo_path: str=None) -> (list, str):
+    """ Return a list of branches that are merged with the default branch on a remote, along with
+    the name of that branch (as tracked locally; e.g. 'origin/main').
+
+    Only local branches and branches of the remote are included.
+    """
+
+    branch_name = repo.default_branch(remote, deadline, repo_path)
 
-    default_branch = repo.default_branch(remote)
+    # note that the name of a remote can contain slashes; e.g. 'team/origin'
+    default_branch = f'{remote}/{branch_name}'
 
-    cmd = f'git branch --all --merged {default_branch}'
+    cmd = ['git', 'branch', '--all', '--merged', default_branch]
 
     if verbose:
         command.display(cmd)
 
-    result = subprocess.run(
-        command.get_argv(cmd),
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
         check=True,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL)
@@ -256,9 +745,182 @@ def find_merged_branches(remote: str, verbose: bool) -> (list, str):
     branches = [branch.strip() for branch in output]
     # remove leading asterisk from current branch
     branches = [branch[2:] if branch.startswith('*') else branch for branch in branches]
-    # remove default branch references
+    # remove branches of any other remotes
+    branches = [branch for branch in branches
+                if not branch.startswith('remotes/') or
+                branch.startswith(f'remotes/{remote}/')]
+    # remove default branch references; both local and of the remote
     branches = [branch for branch in branches
-                if not branch.endswith(default_branch) and
-                not branch == default_branch]
+                if branch not in (branch_name, f'remotes/{default_branch}') and
+                not branch.startswith(f'remotes/{remote}/HEAD')]
 
     return branches, default_branch
+
+
+def find_referenced_commits(verbose: bool=False, deadline: float=None,
+                            repo_path: str=None) -> dict:
+    """ Return a dictionary of references and the commit (by id) that each points to.
+
+    Annotated tags are peeled to the commit they tag. References to anything but commits (e.g. tags
+    of blobs) are not included.
+    """
+
+    cmd = ['git', 'for-each-ref',
+           '--format=%(refname) %(objecttype) %(objectname) %(*objecttype) %(*objectname)']
+
+    if verbose:
+        command.display(cmd)
+
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+
+    commits = {}
+
+    for line in result.stdout.decode('utf-8').splitlines():
+        # note that a reference name can not contain spaces
+        ref, object_type, object_id, *peeled = line.split(' ')
+
+        if object_type == 'tag' and len(peeled) == 2:
+            object_type, object_id = peeled
+
+        if object_type == 'commit':
+            commits[ref] = object_id
+
+    return commits
+
+
+def find_ungraphed_references(objects_path: str, verbose: bool=False, deadline: float=None,
+                              repo_path: str=None) -> (bool, list, list):
+    """ Return True if current repository has a commit-graph, False otherwise; along with a list of
+    references to commits that are not included in the commit-graph, and a list of references to
+    commits that are.
+
+    Commits that are not included must be parsed from the object database when traversed; i.e. the
+    commit-graph is stale.
+    """
+
+    commits = find_referenced_commits(verbose, deadline, repo_path)
+
+    paths = structures.commit_graph_paths(objects_path)
+
+    if len(paths) == 0:
+        return False, list(commits), []
+
+    try:
+        graphed_commits = structures.find_graphed_commits(paths, list(commits.values()))
+    except (OSError, ValueError):
+        # a commit-graph that can not be read is ignored by git as well
+        return False, list(commits), []
+
+    return (True, [ref for ref, commit in commits.items() if commit not in graphed_commits],
+            [ref for ref, commit in commits.items() if commit in graphed_commits])
+
+
+def count_new_commits(references: list, excluded_references: list, limit: int,
+                      verbose: bool=False, deadline: float=None, repo_path: str=None) -> int:
+    """ Return the number of commits reachable from any of the references, but not from any of the
+    excluded references; counting no further than the limit.
+
+    As a commit-graph includes every ancestor of the commits it includes, this is the number of
+    commits missing from it, given the references to commits that are (and are not) included.
+    """
+
+    if len(references) == 0:
+        return 0
+
+    # references are passed on stdin, as there can be more than fit on a command line
+    cmd = ['git', 'rev-list', '--count', f'--max-count={limit}', '--stdin']
+
+    if verbose:
+        command.display(cmd)
+
+    revisions = references + [f'^{reference}' for reference in excluded_references]
+
+    result = command.run(
+        cmd,
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,
+        input='\n'.join(revisions + ['']).encode('utf-8'),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+
+    return int(result.stdout.decode('utf-8').strip())
+
+
+def find_packs(objects_path: str) -> list:
+    """ Return a list of packs (by name; e.g. 'pack-1a2b3c.pack') in an object database. """
+
+    pack_path = os.path.join(objects_path, 'pack')
+
+    try:
+        filenames = os.listdir(pack_path)
+    except OSError:
+        return []
+
+    # a pack is only usable once its index has been written
+    return sorted(filename for filename in filenames
+                  if filename.endswith('.pack') and
+                  f'{filename[:-len(".pack")]}.idx' in filenames)
+
+
+def count_packed_objects(objects_path: str, packs: list) -> dict:
+    """ Return a dictionary of packs (by name) in an object database and the number of objects that
+    each includes. A pack whose index can not be read is counted as empty.
+    """
+
+    pack_path = os.path.join(objects_path, 'pack')
+
+    counts = {}
+
+    for pack in packs:
+        try:
+            counts[pack] = structures.count_packed_objects(
+                os.path.join(pack_path, f'{pack[:-len(".pack")]}.idx'))
+        except (OSError, ValueError):
+            counts[pack] = 0
+
+    return counts
+
+
+def find_indexed_packs(objects_path: str) -> (bool, list, bool):
+    """ Return True if an object database has a multi-pack-index, False otherwise; along with a
+    list of packs that are included in the multi-pack-index, and whether the multi-pack-index has
+    a reachability bitmap.
+    """
+
+    path = structures.multi_pack_index_path(objects_path)
+
+    try:
+        packs, checksum = structures.read_multi_pack_index(path)
+    except (OSError, ValueError):
+        # a multi-pack-index that can not be read is ignored by git as well
+        return False, [], False
+
+    # a bitmap written for a previous multi-pack-index is not used
+    is_bitmapped = os.path.isfile(os.path.join(os.path.dirname(path),
+                                               f'multi-pack-index-{checksum}.bitmap'))
+
+    return True, packs, is_bitmapped
+
+
+def find_bitmapped_packs(objects_path: str, packs: list, indexed_packs: list,
+                         is_indexed_bitmapped: bool) -> list:
+    """ Return a list of the packs in an object database that are covered by a reachability bitmap;
+    given the packs found (see find_packs) and those included in a multi-pack-index (see
+    find_indexed_packs).
+    """
+
+    if is_indexed_bitmapped:
+        # note that git prefers the bitmap of a multi-pack-index over that of any single pack
+        return indexed_packs
+
+    pack_path = os.path.join(objects_path, 'pack')
+
+    return [pack for pack in packs
+            if os.path.isfile(os.path.join(pack_path, f'{pack[:-len(".pack")]}.bitmap'))]
@@ -0,0 +1,216 @@
+# coding=utf-8
+
+"""
+Provides matching of paths against gitignore-rules, without involving git.
+
+Rules are compiled to regular expressions once, so that any number of paths (e.g. every path in the
+history of a repository) can be matched quickly, and without having to exist in the work tree.
+
+See https://git-scm.com/docs/gitignore for details on rules and their precedence.
+"""
+
+import re
+import posixpath
+
+from typing import NamedTuple
+from functools import lru_cache
+
+# the number of directories that are remembered as being excluded or not
+DIRECTORY_CACHE_SIZE = 4096
+
+
+class Rule(NamedTuple):
+    """ Represents a compiled gitignore-rule. """
+
+    pattern: object  # compiled regular expression
+    glob: str  # the pattern as written; without any leading '!' or '/', nor trailing '/'
+    is_negated: bool  # whether the rule re-includes paths (i.e. starts with '!')
+    is_directory_only: bool  # whether the rule only matches directories (i.e. ends with '/')
+    is_anchored: bool  # whether matched against the full path, instead of only the name
+    source: str  # the source of the rule; e.g. '.gitignore:3'
+
+
+def translate(glob: str) -> str:
+    """ Return a regular expression that matches the same paths as a gitignore glob pattern.
+
+    Wildcards never match a slash, except for two consecutive asterisks as a whole path component;
+    e.g. '**/build', 'build/**' or 'a/**/b'.
+    """
+
+    expression = ''
+
+    i = 0
+
+    while i < len(glob):
+        if glob.startswith('**/', i) and (i == 0 or glob[i - 1] == '/'):
+            # any number of leading directories, including none
+            expression += '(?:.*/)?'
+            i += 3
+        elif glob.startswith('**', i) and i + 2 == len(glob) and (i == 0 or glob[i - 1] == '/'):
+            # everything inside
+            expression += '.*'
+            i += 2
+        elif glob[i] == '*':
+            # note that any other consecutive asterisks are considered regular asterisks
+            expression += '[^/]*'
+            i += 1
+        elif glob[i] == '?':
+            expression += '[^/]'
+            i += 1
+        elif glob[i] == '[':
+            end = glob.find(']', i + 2 if glob.startswith(('[!', '[^'), i) else i + 1)
+
+            if end == -1:
+                # not a range; just a bracket
+                expression += re.escape('[')
+                i += 1
+
+                continue
+
+            contents = glob[i + 1:end]
+
+            if contents.startswith(('!', '^')):
+                contents = '^' + contents[1:]
+
+            # a range never matches a slash
+            expression += '(?!/)[' + contents.replace('\\', '\\\\') + ']'
+            i = end + 1
+        elif glob[i] == '\\' and i + 1 < len(glob):
+            expression += re.escape(glob[i + 1])
+            i += 2
+        else:
+            expression += re.escape(glob[i])
+            i += 1
+
+    return expression
+
+
+def parse(text: str, source: str) -> list:
+    """ Return a list of compiled rules from the contents of a file holding gitignore-rules.
+
+    Each rule is attributed to the source and its line number; e.g. '.gitignore:3'.
+    """
+
+    rules = []
+
+    for number, line in enumerate(text.splitlines(), start=1):
+        # trailing spaces are ignored, unless escaped
+        line = re.sub(r'(?<!\\) +$', '', line)
+
+        if len(line) == 0 or line.startswith('#'):
+            continue
+
+        is_negated = line.startswith('!')
+
+        if is_negated:
+            line = line[1:]
+        elif line.startswith(('\\!', '\\#')):
+            line = line[1:]
+
+        is_directory_only = line.endswith('/')
+
+        line = line.rstrip('/')
+
+        if len(line) == 0:
+            continue
+
+        # a pattern with a slash anywhere but the end is relative to the directory of its source
+        is_anchored = '/' in line
+
+        line = line.lstrip('/')
+
+        try:
+            pattern = re.compile(translate(line), re.DOTALL)
+        except re.error:
+            # e.g. a range that is invalid as a regular expression; ignored by git as well
+            continue
+
+        rules.append(Rule(pattern, line, is_negated, is_directory_only, is_anchored,
+                          f'{source}:{number}'))
+
+    return rules
+
+
+class Matcher:
+    """ Represents the gitignore-rules of a repository, for matching paths relative to its root.
+
+    Rules are provided by directory; i.e. the rules of a .gitignore in that directory, or, for the
+    root (''), any rules that apply to the entire repository (.git/info/exclude and the user's
+    global exclusion file). Rules are in order of increasing precedence.
+    """
+
+    def __init__(self, rules: dict):
+        self.rules = rules
+        self.is_directory_excluded = lru_cache(maxsize=DIRECTORY_CACHE_SIZE)(
+            lambda directory: self.match(directory, is_directory=True) is not None)
+
+    def is_excluded(self, path: str) -> bool:
+        """ Determine whether a file is excluded by any rule.
+
+        A file is also excluded if any directory above it is; regardless of any other rules.
+        """
+
+        directory = posixpath.dirname(path)
+        parents = []
+
+        while len(directory) > 0:
+            parents.append(directory)
+            directory = posixpath.dirname(directory)
+
+        if any(self.is_directory_excluded(parent) for parent in reversed(parents)):
+            return True
+
+        return self.match(path) is not None
+
+    def explain(self, path: str) -> Rule:
+        """ Return the rule that excludes a file, or None if the file is not excluded.
+
+        If a directory above the file is excluded, the rule that excludes that directory is
+        returned instead; regardless of any other rules.
+        """
+
+        directory = posixpath.dirname(path)
+        parents = []
+
+        while len(directory) > 0:
+            parents.append(directory)
+            directory = posixpath.dirname(directory)
+
+        for parent in reversed(parents):
+            rule = self.match(parent, is_directory=True)
+
+            if rule is not None:
+                return rule
+
+        return self.match(path)
+
+    def match(self, path: str, is_directory: bool=False) -> Rule:
+        """ Return the rule that excludes a path, or None if the path is not excluded.
+
+        Rules of a .gitignore in a deeper directory take precedence over those higher up, and
+        within the same source, a later rule takes precedence over an earlier one.
+        """
+
+        name = posixpath.basename(path)
+        directory = path
+
+        while len(directory) > 0:
+            directory = posixpath.dirname(directory)
+
+            rules = self.rules.get(directory)
+
+            if rules is None:
+                continue
+
+            relative_path = path[len(directory) + 1:] if len(directory) > 0 else path
+
+            for rule in reversed(rules):
+                if rule.is_directory_only and not is_directory:
+                    continue
+
+                if rule.pattern.fullmatch(relative_path if rule.is_anchored else name) is None:
+                    continue
+
+                return rule if not rule.is_negated else None
+
+        return None
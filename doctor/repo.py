@@ -2,35 +2,43 @@
 
 """
 Provides utility functions for inspecting the current repository.
+
+Functions taking a repo_path inspect the repository found at that path (which can be any path
+inside its work tree) instead of the repository found at the current working directory.
 """
 
 import os
 import re
+import posixpath
 import subprocess
 
+from doctor import command
 
-def can_be_examined() -> bool:
-    """ Return True if git is installed. """
 
-    # assume that if a simple git invocation fails, then git is probably not installed
-    # this is a portable way to determine existence of a binary on PATH, versus using
-    # platform-specific tools like `which` on macOS or (sometimes) `where` on Windows
-    try:
-        result = subprocess.run([
-            'git', '--version'],
-            stdout=subprocess.DEVNULL,  # ignore stdout
-            stderr=subprocess.DEVNULL)  # ignore stderr
+def exists(repo_path: str=None) -> bool:
+    """ Return True if a path is inside the work tree of a repository.
 
-        return result.returncode == 0
+    If no path is provided, the current working directory is used.
+    """
+
+    try:
+        return is_inside_work_tree(repo_path)
     except OSError:
+        # the path does not exist, or is not a directory (or git is not installed)
         return False
 
 
-def exists() -> bool:
-    """ Return True if current working directory is inside the work tree of a repository. """
+def is_inside_work_tree(repo_path: str=None) -> bool:
+    """ Return True if a path is inside the work tree of a repository.
+
+    Unlike exists, raise OSError if git is not installed (or if the path does not exist); so that
+    both can be determined by a single git invocation.
+    """
 
     result = subprocess.run([
         'git', 'rev-parse', '--is-inside-work-tree'],
+        cwd=repo_path,
+        env=command.environment(),
         stdout=subprocess.PIPE,  # capture stdout
         stderr=subprocess.DEVNULL)  # ignore stderr
 
@@ -45,28 +53,81 @@ def exists() -> bool:
     return 'true' in status.lower()
 
 
-def has_remote() -> (bool, str):
-    """ Return True if current repository has one or more remotes, False otherwise. """
+def remotes(deadline: float=None, repo_path: str=None) -> list:
+    """ Return a list of the remotes of current repository (by name), in the order configured. """
 
-    result = subprocess.run([
+    result = command.run([
         'git', 'remote'],
+        deadline=deadline,
+        cwd=repo_path,
         check=True,  # print stacktrace on non-zero exit status
         stdout=subprocess.PIPE,  # capture stdout
         stderr=subprocess.DEVNULL)  # ignore stderr
 
-    remotes = result.stdout.decode('utf-8').splitlines()
+    return result.stdout.decode('utf-8').splitlines()
+
+
+def partial_clone_filters(deadline: float=None, repo_path: str=None) -> dict:
+    """ Return a dictionary of the object filter (e.g. 'blob:none') of each promisor remote of
+    current repository (by name); i.e. each remote that objects missing from a partial clone are
+    fetched from on demand. A filter is None if not known.
+
+    The dictionary is empty if current repository is not a partial clone.
+    """
+
+    result = command.run([
+        'git', 'config', '--null', '--get-regexp',
+        r'^(remote\..+\.(promisor|partialclonefilter)|extensions\.partialclone)$'],
+        deadline=deadline,
+        cwd=repo_path,
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    # note that exit status is non-zero if no variable matches; i.e. not a partial clone
+    # each entry is a key, followed by a newline and its value; unless it has no value at all
+    entries = [entry.partition('\n') for entry in result.stdout.decode('utf-8').split('\0')
+               if len(entry) > 0]
+
+    promisors = []
+    filters = {}
+
+    for key, has_value, value in entries:
+        if key.lower() == 'extensions.partialclone':
+            # a partial clone made by git 2.23 or earlier; the value names the promisor remote
+            promisors.append(value)
+        elif key.endswith('.promisor'):
+            # a boolean variable without a value is true
+            if not has_value or value.lower() in ('true', 'yes', 'on', '1'):
+                promisors.append(key[len('remote.'):-len('.promisor')])
+        else:
+            filters[key[len('remote.'):-len('.partialclonefilter')]] = value
+
+    return {remote: filters.get(remote) for remote in promisors}
 
-    has_remotes = len(remotes) > 0
 
-    # bias toward first listed remote; this could be wrong
-    return has_remotes, remotes[0] if has_remotes else None
+def is_shallow(deadline: float=None, repo_path: str=None) -> bool:
+    """ Return True if current repository is a shallow clone; i.e. its history is cut off at some
+    point (see .git/shallow), False otherwise.
+    """
+
+    result = command.run([
+        'git', 'rev-parse', '--is-shallow-repository'],
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,  # print stacktrace on non-zero exit status
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
 
+    return result.stdout.decode('utf-8').strip() == 'true'
 
-def default_branch(remote: str) -> str:
+
+def default_branch(remote: str, deadline: float=None, repo_path: str=None) -> str:
     """ Return the name of the default branch on a remote. """
 
-    result = subprocess.run([
+    result = command.run([
         'git', 'remote', 'show', remote],
+        deadline=deadline,
+        cwd=repo_path,
         check=True,  # print stacktrace on non-zero exit status
         stdout=subprocess.PIPE,  # capture stdout
         stderr=subprocess.DEVNULL)  # ignore stderr
@@ -82,11 +143,13 @@ def default_branch(remote: str) -> str:
     return name.strip()
 
 
-def absolute_path() -> str:
+def absolute_path(deadline: float=None, repo_path: str=None) -> str:
     """ Return the absolute path to the root of current repository. """
 
-    result = subprocess.run([
+    result = command.run([
         'git', 'rev-parse', '--show-toplevel'],
+        deadline=deadline,
+        cwd=repo_path,
         check=True,  # print stacktrace on non-zero exit status
         stdout=subprocess.PIPE,  # capture stdout
         stderr=subprocess.DEVNULL)  # ignore stderr
@@ -96,6 +159,281 @@ def absolute_path() -> str:
     return path.strip()
 
 
+def relative_path(deadline: float=None, repo_path: str=None) -> str:
+    """ Return the path of the current working directory relative to the root of current repository.
+
+    The path is empty if the current working directory is the root, and otherwise ends with '/'.
+    """
+
+    result = command.run([
+        'git', 'rev-parse', '--show-prefix'],
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,  # print stacktrace on non-zero exit status
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    path = result.stdout.decode('utf-8')
+
+    return path.strip()
+
+
+def pathspecs_from_root(pathspecs: list, deadline: float=None, repo_path: str=None) -> list:
+    """ Return a list of pathspecs (relative to the current working directory) made relative to the
+    root of current repository instead.
+
+    This allows passing pathspecs to git commands that must run from the root; e.g. to take
+    .gitignore files located in parent directories into account.
+    """
+
+    prefix = relative_path(deadline, repo_path)
+
+    def is_outside(relative: str) -> bool:
+        return relative == os.pardir or relative.startswith(os.pardir + os.sep)
+
+    def from_root(path: str) -> str:
+        # keep trailing slashes; they restrict matches to directories
+        suffix = '/' if path.endswith('/') else ''
+
+        if os.path.isabs(path):
+            # git accepts absolute paths inside the work tree; note that the root has any symbolic
+            # links resolved, so the path might have to be resolved as well (e.g. /tmp on macOS)
+            root_path = absolute_path(deadline, repo_path)
+            relative = os.path.relpath(path, root_path)
+
+            if is_outside(relative):
+                relative = os.path.relpath(os.path.realpath(path), os.path.realpath(root_path))
+
+            if is_outside(relative):
+                # left for git to reject
+                return path
+
+            return posixpath.normpath(relative.replace(os.sep, '/')) + suffix
+
+        return posixpath.normpath(prefix + path) + suffix
+
+    resolved_pathspecs = []
+
+    for pathspec in pathspecs:
+        if not pathspec.startswith(':'):
+            resolved_pathspecs.append(from_root(pathspec))
+
+            continue
+
+        # pathspec has magic; in either long form, e.g. ':(top,icase)path', or short form,
+        # e.g. ':!path'; either way, the pattern is only resolved if not already relative to root
+        match = (re.match(r'^:\((?P<magic>[^)]*)\)(?P<path>.*)$', pathspec) or
+                 re.match(r'^:(?P<magic>[/!^]*):?(?P<path>.*)$', pathspec))
+
+        magic = pathspec[:match.start('path')]
+        path = match.group('path')
+
+        is_relative_to_root = ('top' in match.group('magic').split(',') or
+                               '/' in match.group('magic'))
+
+        if not is_relative_to_root:
+            path = from_root(path)
+
+        resolved_pathspecs.append(magic + path)
+
+    return resolved_pathspecs
+
+
+def git_path(deadline: float=None, repo_path: str=None) -> str:
+    """ Return the absolute path to the .git directory of current repository. """
+
+    result = command.run([
+        'git', 'rev-parse', '--absolute-git-dir'],
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,  # print stacktrace on non-zero exit status
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    path = result.stdout.decode('utf-8')
+
+    return path.strip()
+
+
+def objects_path(deadline: float=None, repo_path: str=None) -> str:
+    """ Return the absolute path to the object database of current repository.
+
+    Note that the object database is shared by every worktree of a repository.
+    """
+
+    result = command.run([
+        'git', 'rev-parse', '--git-path', 'objects'],
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,  # print stacktrace on non-zero exit status
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    # the path is relative to the working directory, unless absolute
+    path = result.stdout.decode('utf-8').strip()
+
+    return os.path.abspath(os.path.join(repo_path or os.getcwd(), path))
+
+
+def index_checksum(deadline: float=None, repo_path: str=None) -> str:
+    """ Return the checksum of the index of current repository.
+
+    The checksum is read from the trailer of the index file, and changes whenever the index is
+    written. Return an empty string if there is no index.
+    """
+
+    path = os.path.join(git_path(deadline, repo_path), 'index')
+
+    try:
+        with open(path, 'rb') as file:
+            # the trailer is a 20 byte SHA-1 (or 32 byte SHA-256) checksum of the preceding content;
+            # reading the last 32 bytes covers both
+            file.seek(0, os.SEEK_END)
+            file.seek(max(file.tell() - 32, 0))
+
+            trailer = file.read()
+
+            stat = os.fstat(file.fileno())
+    except FileNotFoundError:
+        return ''
+
+    if trailer.count(0) == len(trailer):
+        # the checksum is not computed when index.skipHash is enabled; resort to file status
+        return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+    return trailer.hex()
+
+
+def refs_state(deadline: float=None, repo_path: str=None) -> str:
+    """ Return the state of all references (both loose and packed) in current repository.
+
+    The state changes whenever a reference is created, deleted or updated, or when HEAD changes.
+    """
+
+    result = command.run([
+        'git', 'for-each-ref', '--format=%(objectname) %(refname)'],
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,  # print stacktrace on non-zero exit status
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    refs = result.stdout.decode('utf-8')
+
+    with open(os.path.join(git_path(deadline, repo_path), 'HEAD')) as file:
+        head = file.read()
+
+    return head + refs
+
+
+def remote_state(remote: str, deadline: float=None, repo_path: str=None) -> str:
+    """ Return the state of a remote, as last seen by current repository.
+
+    The state changes whenever the remote is reconfigured, or whenever anything is fetched from it.
+    Note that it does not reflect changes on the remote that have not yet been fetched.
+    """
+
+    result = command.run([
+        'git', 'config', '--get-regexp', rf'^remote\.{re.escape(remote)}\.'],
+        deadline=deadline,
+        cwd=repo_path,
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    configuration = result.stdout.decode('utf-8')
+
+    try:
+        fetched = os.stat(os.path.join(git_path(deadline, repo_path), 'FETCH_HEAD')).st_mtime_ns
+    except FileNotFoundError:
+        fetched = 0
+
+    return f'{configuration}{fetched}'
+
+
+def objects_state(deadline: float=None, repo_path: str=None) -> str:
+    """ Return the state of the object database of current repository.
+
+    The state changes whenever objects are added, packed or pruned, or whenever a reflog is updated.
+    """
+
+    result = command.run([
+        'git', 'count-objects', '--verbose'],
+        deadline=deadline,
+        cwd=repo_path,
+        check=True,  # print stacktrace on non-zero exit status
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    objects = result.stdout.decode('utf-8')
+
+    logs_path = os.path.join(git_path(deadline, repo_path), 'logs')
+
+    logs = [os.stat(os.path.join(dirpath, filename))
+            for dirpath, dirnames, filenames in os.walk(logs_path) for filename in filenames]
+    logs = sum(log.st_size for log in logs), max((log.st_mtime_ns for log in logs), default=0)
+
+    return f'{objects}{logs}'
+
+
+def tracked_directories(deadline: float=None, repo_path: str=None) -> list:
+    """ Return a list of directories that contain tracked files in current repository, including
+    every directory above those (as any of them can hold gitignore-rules applying to those files).
+
+    Directories are relative to the root of the repository; the root itself is listed as ''.
+    """
+
+    result = command.run([
+        'git', 'ls-files', '-z'],
+        deadline=deadline,
+        cwd=absolute_path(deadline, repo_path),
+        check=True,  # print stacktrace on non-zero exit status
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    files = result.stdout.decode('utf-8').split('\0')
+
+    directories = {''}
+
+    for file in files:
+        directory = os.path.dirname(file)
+
+        # stop at the first directory already listed, as every directory above it is listed too
+        while directory not in directories:
+            directories.add(directory)
+            directory = os.path.dirname(directory)
+
+    return sorted(directories)
+
+
+def exclusion_filepaths(directories: list, deadline: float=None, repo_path: str=None) -> list:
+    """ Return a list of absolute paths to every file that can hold gitignore-rules applying to
+    files in the provided directories; whether such files exist or not.
+
+    This includes the user's global exclusion file and .git/info/exclude, followed by a .gitignore
+    in each directory (in the order provided).
+    """
+
+    result = command.run([
+        'git', 'config', '--path', 'core.excludesFile'],
+        deadline=deadline,
+        cwd=repo_path,
+        stdout=subprocess.PIPE,  # capture stdout
+        stderr=subprocess.DEVNULL)  # ignore stderr
+
+    global_filepath = result.stdout.decode('utf-8').strip()
+
+    if len(global_filepath) == 0:
+        config_path = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+        global_filepath = os.path.join(config_path, 'git', 'ignore')
+
+    root_path = absolute_path(deadline, repo_path)
+
+    filepaths = [global_filepath, os.path.join(git_path(deadline, repo_path), 'info', 'exclude')]
+    filepaths.extend(os.path.join(root_path, directory, '.gitignore') for directory in directories)
+
+    return filepaths
+
+
 def size_in_bytes(exclude_work_tree: bool=False) -> int:
     """ Return the size (in bytes) of current repository.
 
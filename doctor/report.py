@@ -5,9 +5,27 @@ Provides outputting facilities for reports and diagnosis conclusions.
 """
 
 import sys
+import math
 import textwrap
 
 
+def pretty_size(size_in_bytes: int) -> str:
+    """ Return a size (in bytes) as a prettified string. """
+
+    if size_in_bytes == 0:
+        return '0B'
+
+    size_variants = ('B', 'KB', 'MB', 'GB')
+    size_index = min(int(math.floor(math.log(abs(size_in_bytes), 1024))), len(size_variants) - 1)
+    size = round(abs(size_in_bytes) / math.pow(1024, size_index), 2)
+
+    size_type = size_variants[size_index]
+
+    precision = 2 if size_index > 1 else 0
+
+    return f'{size:.{precision}f}{size_type}'
+
+
 def supports_color(stream) -> bool:
     """ Determine whether an output stream (e.g. stdout/stderr) supports displaying colored text.
 
@@ -57,6 +75,20 @@ def information(message: str, wrapped: bool=True):
     print(output, file=stream)
 
 
+def progress(message: str, finished: bool=False):
+    """ Emit an informative diagnostic message that replaces any previous progress message.
+
+    Only meant for streams that support rewriting lines; i.e. terminals. If finished is True, the
+    message is kept and any following messages are emitted after it.
+    """
+
+    stream = sys.stderr
+    # rewind to the start of the line, and clear anything remaining from a previous, longer message
+    output = f'\r{message}\x1b[K'
+
+    print(output, file=stream, end='\n' if finished else '', flush=True)
+
+
 def note(message: str):
     """ Emit a diagnostic message related to an important diagnostic.
 
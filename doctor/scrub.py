@@ -4,19 +4,180 @@
 Provides cleaning functions for the current repository.
 """
 
+import re
+import time
+import subprocess
+
+from typing import NamedTuple
+
 from doctor import command
 
 import doctor.repo as repo
+import doctor.report as report
 
 GIT_EXPIRE = 'git reflog expire --expire-unreachable=now --all --stale-fix'
 GIT_GC = 'git gc --prune=now'
 GIT_GC_AGGRESSIVE = GIT_GC + ' --aggressive'
 
+# note that writing a split commit-graph only adds commits that are not already included, and merges
+# the chain of graph files as needed
+GIT_WRITE_COMMIT_GRAPH = 'git commit-graph write --reachable --split'
+GIT_WRITE_MULTI_PACK_INDEX = 'git multi-pack-index write'
+GIT_WRITE_MULTI_PACK_INDEX_BITMAP = GIT_WRITE_MULTI_PACK_INDEX + ' --bitmap'
+
+# traversals that represent common operations; the first one benefits from a commit-graph,
+# the second one from reachability bitmaps (and a multi-pack-index)
+# note that objects missing from a partial clone are skipped, instead of fetched on demand
+TRAVERSALS = {
+    'commits': 'git rev-list --count --all',
+    'objects': 'git rev-list --count --all --objects --use-bitmap-index --missing=allow-promisor'
+}
+
+# each traversal is timed a number of times, and the fastest time is used; so that the first one
+# can warm up any caches of the operating system
+TRAVERSAL_RUNS = 2
+
+# the pattern of a progress report by git; e.g. 'Compressing objects:  45% (9/20)'
+PROGRESS_PATTERN = re.compile(r'^(?P<phase>[A-Z][^:]*):\s+(?P<percentage>\d+)% '
+                              r'\((?P<done>\d+)/(?P<total>\d+)\)')
+
+# the time (in seconds) that a phase must have been running before an estimate is made
+ESTIMATION_DELAY = 1
+
+
+class Limits(NamedTuple):
+    """ Represents limits on the resources used by a scrubdown; e.g. to avoid starving other
+    processes on a shared host. Any limit that is None is left to git.
+    """
+
+    threads: int = None  # number of threads used to compress objects
+    window_memory: int = None  # memory (in bytes) used by each thread to compress objects
+    pack_size_limit: int = None  # size (in bytes) of each pack written
+    is_lowered: bool = False  # whether to run at lowered CPU and IO priority
+
+
+class Progress:
+    """ Represents the progress of a git process, as reported in phases; e.g. 'Counting objects'.
+
+    Emit each report along with an estimate of the time left of its phase.
+    """
+
+    def __init__(self):
+        self.phase = None
+        self.started = None
+        self.message = None
+
+    def update(self, line: str):
+        """ Update progress from a line of output. """
+
+        match = PROGRESS_PATTERN.match(line)
+
+        if match is None:
+            return
+
+        phase = match.group('phase')
+        done, total = int(match.group('done')), int(match.group('total'))
+
+        if phase != self.phase:
+            self.finish()
+
+            self.phase = phase
+            self.started = time.monotonic()
+
+        message = f'{phase.lower()}: {match.group("percentage")}% ({done}/{total})'
+
+        elapsed = time.monotonic() - self.started
+
+        if 0 < done < total and elapsed >= ESTIMATION_DELAY:
+            # assume that the rest of the phase proceeds at the same rate as it has so far
+            message = f'{message}, about {pretty_duration(elapsed / done * (total - done))} left'
+
+        self.message = message
+
+        report.progress(message)
+
+    def finish(self):
+        """ Keep the last report of the current phase, if any. """
+
+        if self.message is not None:
+            report.progress(self.message, finished=True)
+
+        self.phase = None
+        self.message = None
+
+
+def pretty_duration(seconds: float) -> str:
+    """ Return a duration (in seconds) as a prettified string; e.g. '1m30s'. """
+
+    minutes, seconds = divmod(int(round(seconds)), 60)
+
+    if minutes == 0:
+        return f'{seconds}s'
+
+    hours, minutes = divmod(minutes, 60)
+
+    if hours == 0:
+        return f'{minutes}m{seconds:02d}s'
+
+    return f'{hours}h{minutes:02d}m'
+
+
+def governed(cmd: str, limits: Limits) -> (list, dict):
+    """ Return a list of arguments, and any keyword arguments for subprocess.Popen, that run a git
+    command within limits.
+    """
+
+    argv = command.get_argv(cmd)
+
+    configuration = []
 
-def trim(aggressively: bool=False, verbose: bool=False) -> int:
+    if limits.threads is not None:
+        configuration.append(f'pack.threads={limits.threads}')
+
+    if limits.window_memory is not None:
+        configuration.append(f'pack.windowMemory={limits.window_memory}')
+
+    if limits.pack_size_limit is not None:
+        configuration.append(f'pack.packSizeLimit={limits.pack_size_limit}')
+
+    # configuration is given for this invocation only (before the subcommand; e.g. `git -c a=b gc`),
+    # and applies to any git processes that it runs in turn; e.g. gc running pack-objects
+    for value in reversed(configuration):
+        argv[1:1] = ['-c', value]
+
+    if limits.is_lowered:
+        return command.lowered(argv)
+
+    return argv, {}
+
+
+def housekeep(cmd: str, limits: Limits, verbose: bool=False, show_progress: bool=False) -> int:
+    """ Run a git housekeeping command within limits and return exit code.
+
+    If show_progress is True, emit the progress of the command (unless verbose, in which case the
+    output of the command is displayed as is).
+    """
+
+    argv, kwargs = governed(cmd, limits)
+
+    if verbose or not show_progress:
+        return command.execute(argv, show_argv=verbose, show_output=verbose, **kwargs)
+
+    progress = Progress()
+
+    try:
+        return command.follow(argv, progress.update, **kwargs)
+    finally:
+        progress.finish()
+
+
+def trim(aggressively: bool=False, verbose: bool=False, limits: Limits=Limits(),
+         show_progress: bool=False) -> int:
     """ Trim current repository and return the difference (in bytes) from before and after.
 
     The difference is negative if the repository became smaller, positive if it became larger.
+
+    See housekeep for details on limits and progress.
     """
 
     # only check size of the .git directory
@@ -25,16 +186,74 @@ def trim(aggressively: bool=False, verbose: bool=False) -> int:
     size_before = repo.size_in_bytes(exclude_work_tree=only_count_git_dir)
 
     # expire all reflog entries to unreachable objects immediately, enabling pruning through gc
-    command.execute(GIT_EXPIRE, show_argv=verbose, show_output=verbose)
+    housekeep(GIT_EXPIRE, limits, verbose)
 
     # run garbage collection; automatically triggers prune, repack and more
-    command.execute(
+    housekeep(
         (GIT_GC_AGGRESSIVE if aggressively else
          GIT_GC),
-        show_argv=verbose,
-        show_output=verbose)
+        limits,
+        verbose,
+        show_progress)
 
     size_after = repo.size_in_bytes(exclude_work_tree=only_count_git_dir)
     size_difference = size_before - size_after
 
     return -size_difference
+
+
+def time_traversals(limits: Limits=Limits()) -> dict:
+    """ Return a dictionary of the time (in seconds) that each traversal takes in current
+    repository.
+
+    See TRAVERSALS.
+    """
+
+    timings = {}
+
+    for name, cmd in TRAVERSALS.items():
+        argv, kwargs = governed(cmd, limits)
+
+        runs = []
+
+        for _ in range(TRAVERSAL_RUNS):
+            started = time.monotonic()
+
+            command.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+
+            runs.append(time.monotonic() - started)
+
+        timings[name] = min(runs)
+
+    return timings
+
+
+def optimize(verbose: bool=False, limits: Limits=Limits(),
+             show_progress: bool=False) -> (dict, dict, list):
+    """ Write or refresh the structures that speed up traversals and lookups in current repository;
+    i.e. a commit-graph, a multi-pack-index and reachability bitmaps.
+
+    Unlike trim, no objects are repacked or pruned; so this is much faster than a full garbage
+    collection.
+
+    Return the time taken by each traversal before and after (see time_traversals), along with a
+    list of any structures that could not be written.
+    """
+
+    timings_before = time_traversals(limits)
+
+    failed_structures = []
+
+    if housekeep(GIT_WRITE_COMMIT_GRAPH, limits, verbose, show_progress) != 0:
+        failed_structures.append('commit-graph')
+
+    # writing a bitmap requires git 2.34 or later; still write the multi-pack-index if it fails
+    if housekeep(GIT_WRITE_MULTI_PACK_INDEX_BITMAP, limits, verbose, show_progress) != 0:
+        failed_structures.append('reachability bitmap')
+
+        if housekeep(GIT_WRITE_MULTI_PACK_INDEX, limits, verbose, show_progress) != 0:
+            failed_structures.append('multi-pack-index')
+
+    timings_after = time_traversals(limits)
+
+    return timings_before, timings_after, failed_structures
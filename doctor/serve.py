@@ -0,0 +1,383 @@
+# coding=utf-8
+
+"""
+Provides a long-running server that examines repositories on request.
+
+Requests and responses are exchanged as newline-delimited JSON; i.e. one JSON object per line.
+A request names a repository, and optionally which examinations to run and any options:
+
+    {"id": 1, "path": "/path/to/repo", "checks": ["readme"], "options": {"budget": 5}}
+
+The outcome of each examination is sent as soon as it completes, followed by a final response that
+marks the request as done (along with an error, if the request could not be served):
+
+    {"id": 1, "examination": "readme", "status": "healthy", "diagnosis": null}
+    {"id": 1, "done": true}
+
+Any state that is costly to establish is kept between requests for each repository; e.g. the cache
+of examination results, and helper processes. Examinations are run as if using the --cache option.
+"""
+
+import os
+import json
+import socket
+import threading
+import subprocess
+import socketserver
+
+from collections import OrderedDict
+
+from doctor import command
+from doctor.diagnose import (
+    diagnose, diagnose_staged, find_unknown_checks, find_unknown_remotes, describe_error,
+    check_cached_eligibility, Diagnosis, Outcome, CUT_SHORT, DEFECTIVE, STAGED_SIZE_LIMIT
+)
+
+import doctor.cache as cache
+import doctor.repo as repo
+
+# the number of repositories that state is kept for; the least recently examined is let go first
+SESSION_LIMIT = 32
+
+# the options that a request can provide, and their types
+REQUEST_OPTIONS = {
+    'budget': (int, float),
+    'pathspecs': list,
+    'per_file': bool,
+    'staged': bool,
+    'max_size': int,
+    'remotes': list,
+    'remote_timeout': (int, float)
+}
+
+
+class Session:
+    """ Represents the state kept between requests for a single repository. """
+
+    def __init__(self, root: str):
+        self.root = root
+        # the cache of examination results; loaded on first use
+        self.results = None
+        self.helper = command.Helper('git cat-file --batch-check=%(objectsize)', cwd=root)
+        # examinations of the same repository are run one at a time
+        self.lock = threading.Lock()
+
+    def close(self):
+        """ Stop any helper processes. """
+
+        with self.lock:
+            self.helper.close()
+
+
+class Server:
+    """ Represents a server that keeps sessions for the repositories it has examined. """
+
+    def __init__(self):
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def session(self, root: str) -> Session:
+        """ Return the session of a repository, starting a new session if there is none. """
+
+        evicted_sessions = []
+
+        with self.lock:
+            session = self.sessions.get(root)
+
+            if session is None:
+                session = Session(root)
+
+                self.sessions[root] = session
+
+            self.sessions.move_to_end(root)
+
+            while len(self.sessions) > SESSION_LIMIT:
+                evicted_sessions.append(self.sessions.popitem(last=False)[1])
+
+        # note that an evicted session might still be in use, and closing it waits until it is not;
+        # so close it in the background, without holding up this (or any other) request
+        for evicted_session in evicted_sessions:
+            threading.Thread(target=evicted_session.close, daemon=True).start()
+
+        return session
+
+    def close(self):
+        """ End every session. """
+
+        with self.lock:
+            sessions = list(self.sessions.values())
+
+            self.sessions.clear()
+
+        for session in sessions:
+            session.close()
+
+    def handle(self, request):
+        """ Serve a request and yield each response as it becomes available. """
+
+        identifier = request.get('id') if isinstance(request, dict) else None
+
+        try:
+            for outcome in self.examine(request):
+                response = {'id': identifier,
+                            'examination': outcome.examination,
+                            'status': outcome.status,
+                            'diagnosis': outcome.diagnosis._asdict()
+                            if outcome.diagnosis is not None else None}
+
+                if outcome.error is not None:
+                    response['error'] = outcome.error
+
+                yield response
+        except ValueError as error:
+            yield {'id': identifier, 'done': True, 'error': str(error)}
+
+            return
+        except Exception as error:
+            # examinations fail individually (see diagnose); but anything else that fails (e.g.
+            # the eligibility check, or an unexpected error) must not stop the server from
+            # answering other requests
+            yield {'id': identifier, 'done': True, 'error': describe_error(error)}
+
+            return
+
+        yield {'id': identifier, 'done': True}
+
+    def examine(self, request):
+        """ Examine the repository of a request, and yield the outcome of each examination as it
+        completes.
+
+        Raise ValueError if the request is not valid.
+        """
+
+        if not isinstance(request, dict):
+            raise ValueError('request must be an object')
+
+        path = request.get('path')
+
+        if not isinstance(path, str):
+            raise ValueError('request must provide a path')
+
+        checks = request.get('checks')
+
+        if checks is not None and (not isinstance(checks, list) or
+                                   not all(isinstance(check, str) for check in checks)):
+            raise ValueError('checks must be a list of names')
+
+        options = request.get('options', {})
+
+        if not isinstance(options, dict):
+            raise ValueError('options must be an object')
+
+        for option, value in options.items():
+            if option not in REQUEST_OPTIONS:
+                raise ValueError(f'unknown option: {option}')
+
+            # note that booleans are integers as well, but never a valid size or budget
+            if not isinstance(value, REQUEST_OPTIONS[option]) or (
+                    isinstance(value, bool) and REQUEST_OPTIONS[option] is not bool):
+                raise ValueError(f'option has wrong type: {option}')
+
+        if not all(isinstance(pathspec, str) for pathspec in options.get('pathspecs', [])):
+            raise ValueError('pathspecs must be a list of strings')
+
+        if not all(isinstance(remote, str) for remote in options.get('remotes', [])):
+            raise ValueError('remotes must be a list of names')
+
+        staged = options.get('staged', False)
+
+        unknown_checks = find_unknown_checks(checks, staged)
+
+        if len(unknown_checks) > 0:
+            raise ValueError(f'unknown examinations: {", ".join(unknown_checks)}')
+
+        budget = options.get('budget')
+
+        if budget is not None and budget <= 0:
+            raise ValueError('budget must be a positive number of seconds')
+
+        remote_timeout = options.get('remote_timeout')
+
+        if remote_timeout is not None and remote_timeout <= 0:
+            raise ValueError('remote timeout must be a positive number of seconds')
+
+        deadline = command.deadline_from(budget)
+
+        try:
+            root = repo.absolute_path(deadline, repo_path=path)
+        except (OSError, subprocess.CalledProcessError):
+            raise ValueError(f'not inside a work tree: {path}')
+        except subprocess.TimeoutExpired:
+            yield Outcome('eligibility', CUT_SHORT, None)
+
+            return
+
+        session = self.session(root)
+
+        with session.lock:
+            if staged:
+                yield from diagnose_staged(
+                    deadline=deadline,
+                    size_limit=options.get('max_size', STAGED_SIZE_LIMIT),
+                    checks=checks,
+                    repo_path=root,
+                    helper=session.helper)
+
+                return
+
+            try:
+                outcome = self.check_eligibility(session, deadline)
+
+                if outcome is not None:
+                    yield outcome
+
+                    return
+
+                # pathspecs are relative to the path of the request
+                pathspecs = repo.pathspecs_from_root(options.get('pathspecs', []), deadline,
+                                                     repo_path=path)
+            except subprocess.TimeoutExpired:
+                yield Outcome('eligibility', CUT_SHORT, None)
+
+                return
+
+            remotes = options.get('remotes')
+
+            unknown_remotes = find_unknown_remotes(remotes, root)
+
+            if len(unknown_remotes) > 0:
+                raise ValueError(f'unknown remotes: {", ".join(unknown_remotes)}')
+
+            yield from diagnose(
+                deadline=deadline,
+                use_cache=True,
+                pathspecs=pathspecs,
+                per_file=options.get('per_file', False),
+                checks=checks,
+                remotes=remotes,
+                remote_timeout=remote_timeout,
+                repo_path=root,
+                results=session.results)
+
+    @staticmethod
+    def check_eligibility(session: Session, deadline: float=None) -> Outcome:
+        """ Return an outcome if the repository of a session is not eligible for examination.
+
+        Return None if eligible. The check is skipped if the repository was found eligible before
+        and has not changed since (see check_cached_eligibility).
+        """
+
+        if session.results is None:
+            session.results = cache.load(session.root)
+
+        is_eligible, issues = check_cached_eligibility(session.results, deadline=deadline,
+                                                       repo_path=session.root)
+
+        if not is_eligible:
+            return Outcome('eligibility', DEFECTIVE,
+                           Diagnosis(message='repository is not eligible for examination',
+                                     supplement=None,
+                                     notes=issues))
+
+        return None
+
+
+def serve(server: Server, input, output):
+    """ Serve requests read from a stream, and write responses to another, until the input ends.
+
+    Both streams must be text streams (e.g. sys.stdin and sys.stdout).
+    """
+
+    for line in input:
+        if len(line.strip()) == 0:
+            continue
+
+        try:
+            request = json.loads(line)
+        except ValueError:
+            responses = [{'id': None, 'done': True, 'error': 'request is not valid JSON'}]
+        else:
+            responses = server.handle(request)
+
+        for response in responses:
+            output.write(json.dumps(response) + '\n')
+            # send each response as soon as it is available, instead of when a buffer fills up
+            output.flush()
+
+
+def serve_socket(server: Server, path: str):
+    """ Serve requests over a Unix domain socket at a path, until interrupted.
+
+    Each connection is served concurrently; see serve. Not supported on Windows.
+
+    Raise OSError if the socket could not be created; e.g. if already in use by another server.
+    """
+
+    if is_socket_stale(path):
+        # left behind by a server that did not exit cleanly
+        os.remove(path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            input = (line.decode('utf-8') for line in self.rfile)
+            output = TextOutput(self.wfile)
+
+            try:
+                serve(server, input, output)
+            except (BrokenPipeError, ConnectionResetError):
+                # the client disconnected before every response was written
+                pass
+
+    # make sure the socket can only be connected to by the current user
+    umask = os.umask(0o177)
+
+    try:
+        listener = socketserver.ThreadingUnixStreamServer(path, Handler)
+    finally:
+        os.umask(umask)
+
+    listener.daemon_threads = True
+
+    try:
+        listener.serve_forever()
+    finally:
+        listener.server_close()
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def is_socket_stale(path: str) -> bool:
+    """ Determine whether a socket exists at a path without a server listening on it. """
+
+    if not os.path.exists(path):
+        return False
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        return True
+    except OSError:
+        # not a socket at all; leave it to be reported when binding
+        return False
+    finally:
+        probe.close()
+
+    return False
+
+
+class TextOutput:
+    """ Represents a text stream that writes to a binary stream. """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text: str):
+        self.stream.write(text.encode('utf-8'))
+
+    def flush(self):
+        self.stream.flush()
@@ -0,0 +1,236 @@
+# coding=utf-8
+
+"""
+Provides readers for the files that git writes to speed up operations on its object database;
+i.e. commit-graphs, multi-pack-indexes and reachability bitmaps, as well as pack indexes.
+
+See https://git-scm.com/docs/gitformat-commit-graph and
+https://git-scm.com/docs/gitformat-pack#_multi_pack_index_midx_files_have_the_following_format
+"""
+
+import os
+import mmap
+import struct
+
+# the length (in bytes) of object ids by hash version; i.e. SHA-1 or SHA-256
+HASH_LENGTHS = {1: 20, 2: 32}
+
+COMMIT_GRAPH_SIGNATURE = b'CGPH'
+MULTI_PACK_INDEX_SIGNATURE = b'MIDX'
+PACK_INDEX_SIGNATURE = b'\377tOc'
+
+
+def commit_graph_paths(objects_path: str) -> list:
+    """ Return a list of paths to every commit-graph file in an object database.
+
+    A commit-graph is either a single file, or a chain of files written incrementally (i.e. split).
+    """
+
+    paths = []
+
+    path = os.path.join(objects_path, 'info', 'commit-graph')
+
+    if os.path.isfile(path):
+        paths.append(path)
+
+    chain_path = os.path.join(objects_path, 'info', 'commit-graphs')
+
+    try:
+        with open(os.path.join(chain_path, 'commit-graph-chain')) as file:
+            graphs = file.read().split()
+    except OSError:
+        graphs = []
+
+    paths.extend(os.path.join(chain_path, f'graph-{graph}.graph') for graph in graphs)
+
+    return paths
+
+
+def find_graphed_commits(paths: list, commit_ids: list) -> set:
+    """ Return the set of commits (by id) that are included in any of the commit-graph files.
+
+    Raise ValueError if any file is not a commit-graph, or of an unsupported version.
+    """
+
+    graphed_commits = set()
+
+    for path in paths:
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            signature, version, hash_version, chunk_count = struct.unpack_from('>4sBBB', data)
+
+            if signature != COMMIT_GRAPH_SIGNATURE or version != 1:
+                raise ValueError(f'not a supported commit-graph: {path}')
+
+            chunks = read_chunk_table(data, 8, chunk_count)
+
+            hash_length = HASH_LENGTHS.get(hash_version)
+
+            if hash_length is None or b'OIDF' not in chunks or b'OIDL' not in chunks:
+                raise ValueError(f'not a supported commit-graph: {path}')
+
+            fanout_offset, _ = chunks[b'OIDF']
+            lookup_offset, _ = chunks[b'OIDL']
+
+            for commit_id in commit_ids:
+                if commit_id in graphed_commits:
+                    continue
+
+                if contains_object(data, bytes.fromhex(commit_id), fanout_offset,
+                                   lookup_offset, hash_length):
+                    graphed_commits.add(commit_id)
+
+    return graphed_commits
+
+
+def multi_pack_index_path(objects_path: str) -> str:
+    """ Return the path to the multi-pack-index of an object database. """
+
+    return os.path.join(objects_path, 'pack', 'multi-pack-index')
+
+
+def read_multi_pack_index(path: str) -> (list, str):
+    """ Return a list of the packs (by name; e.g. 'pack-1a2b3c.pack') included in a
+    multi-pack-index, along with its checksum.
+
+    Raise ValueError if the file is not a multi-pack-index, or of an unsupported version.
+    """
+
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    signature, version, hash_version, chunk_count, base_count, pack_count = struct.unpack_from(
+        '>4sBBBBI', data)
+
+    if signature != MULTI_PACK_INDEX_SIGNATURE or version != 1:
+        raise ValueError(f'not a supported multi-pack-index: {path}')
+
+    chunks = read_chunk_table(data, 12, chunk_count)
+
+    hash_length = HASH_LENGTHS.get(hash_version)
+
+    if hash_length is None or b'PNAM' not in chunks:
+        raise ValueError(f'not a supported multi-pack-index: {path}')
+
+    start, end = chunks[b'PNAM']
+
+    # names are of pack indexes (i.e. ending with .idx), separated and padded by null bytes
+    names = [name.decode('utf-8') for name in data[start:end].split(b'\0') if len(name) > 0]
+    names = [os.path.splitext(name)[0] + '.pack' for name in names[:pack_count]]
+
+    # the checksum trails the file, and names the reachability bitmap written along with it
+    checksum = data[-hash_length:].hex()
+
+    return names, checksum
+
+
+def promisor_pack_index_paths(objects_path: str) -> list:
+    """ Return a list of paths to the index of every pack in an object database that was fetched
+    from a promisor remote; i.e. into a partial clone.
+
+    Such a pack is marked by a file of the same name, but ending with .promisor.
+    """
+
+    pack_path = os.path.join(objects_path, 'pack')
+
+    try:
+        names = os.listdir(pack_path)
+    except OSError:
+        names = []
+
+    return [os.path.join(pack_path, os.path.splitext(name)[0] + '.idx')
+            for name in sorted(names) if name.endswith('.promisor')]
+
+
+def find_packed_objects(paths: list, object_ids: list) -> set:
+    """ Return the set of objects (by id) that are included in any of the pack indexes.
+
+    Raise ValueError if any file is not a pack index, or of an unsupported version.
+    """
+
+    packed_objects = set()
+
+    if len(object_ids) == 0:
+        return packed_objects
+
+    # pack indexes do not record the hash version; but it is the same for every object
+    hash_length = len(object_ids[0]) // 2
+
+    for path in paths:
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            signature, version = struct.unpack_from('>4sI', data)
+
+            if signature != PACK_INDEX_SIGNATURE or version != 2:
+                raise ValueError(f'not a supported pack index: {path}')
+
+            # the fanout follows the header, and the sorted object ids follow the fanout
+            fanout_offset = 8
+            lookup_offset = fanout_offset + 256 * 4
+
+            for object_id in object_ids:
+                if object_id in packed_objects:
+                    continue
+
+                if contains_object(data, bytes.fromhex(object_id), fanout_offset,
+                                   lookup_offset, hash_length):
+                    packed_objects.add(object_id)
+
+    return packed_objects
+
+
+def count_packed_objects(path: str) -> int:
+    """ Return the number of objects included in a pack index.
+
+    Raise ValueError if the file is not a pack index, or of an unsupported version.
+    """
+
+    with open(path, 'rb') as file:
+        data = file.read(8 + 256 * 4)
+
+    if len(data) < 8 + 256 * 4:
+        raise ValueError(f'not a supported pack index: {path}')
+
+    signature, version = struct.unpack_from('>4sI', data)
+
+    if signature != PACK_INDEX_SIGNATURE or version != 2:
+        raise ValueError(f'not a supported pack index: {path}')
+
+    # the last entry of the fanout is the number of objects with any id
+    return struct.unpack_from('>I', data, 8 + 255 * 4)[0]
+
+
+def read_chunk_table(data, offset: int, chunk_count: int) -> dict:
+    """ Return a dictionary of chunks (by id) and their start and end offsets. """
+
+    entries = [struct.unpack_from('>4sQ', data, offset + index * 12)
+               for index in range(chunk_count + 1)]
+
+    # the table is terminated by an entry that marks the end of the last chunk
+    return {chunk_id: (start, end) for (chunk_id, start), (_, end) in zip(entries, entries[1:])}
+
+
+def contains_object(data, object_id: bytes, fanout_offset: int, lookup_offset: int,
+                    hash_length: int) -> bool:
+    """ Determine whether an object id is found in a sorted lookup table of object ids. """
+
+    # the fanout holds the number of object ids whose first byte is at most the index of each entry;
+    # narrowing the search to object ids that share the first byte
+    first_byte = object_id[0]
+
+    low = struct.unpack_from('>I', data, fanout_offset + (first_byte - 1) * 4)[0] \
+        if first_byte > 0 else 0
+    high = struct.unpack_from('>I', data, fanout_offset + first_byte * 4)[0]
+
+    while low < high:
+        middle = (low + high) // 2
+        offset = lookup_offset + middle * hash_length
+        candidate = data[offset:offset + hash_length]
+
+        if candidate == object_id:
+            return True
+
+        if candidate < object_id:
+            low = middle + 1
+        else:
+            high = middle
+
+    return False
@@ -51,9 +51,6 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     platforms='any',
-    install_requires=[
-        'docopt==0.6.2'
-    ],
     entry_points={
         'console_scripts': [
             'git-doctor=doctor.__main__:main',
@@ -0,0 +1,96 @@
+# coding=utf-8
+
+"""
+Tests for parsing command-line arguments against the usages of git-doctor.
+"""
+
+import pytest
+
+from doctor.__main__ import OPTIONS, OPTION_ALIASES, OPTION_DEFAULTS, USAGES
+from doctor.arguments import parse, UsageError
+
+
+def parse_usage(*argv) -> dict:
+    """ Return the arguments parsed from argv, as parsed by the git-doctor cli. """
+
+    return parse(list(argv), options=OPTIONS, usages=USAGES, aliases=OPTION_ALIASES,
+                 defaults=OPTION_DEFAULTS, operands='<pathspec>', is_separated=True)
+
+
+def test_default_usage():
+    args = parse_usage()
+
+    assert args['scrub'] is False
+    assert args['serve'] is False
+    assert args['--cache'] is False
+    assert args['--budget'] is None
+    assert args['--remote'] == []
+    assert args['--max-size'] == '1MB'
+    assert args['<pathspec>'] == []
+
+
+def test_flags_and_values():
+    args = parse_usage('--cache', '--budget=10', '--remote-timeout', '5', '-v')
+
+    assert args['--cache'] is True
+    assert args['--budget'] == '10'
+    assert args['--remote-timeout'] == '5'
+    assert args['--verbose'] is True
+
+
+def test_repeated_values():
+    args = parse_usage('--remote=origin', '--remote', 'upstream')
+
+    assert args['--remote'] == ['origin', 'upstream']
+
+
+def test_pathspecs_follow_separator():
+    args = parse_usage('--per-file', '--', 'docs', '--cache')
+
+    # anything after the separator is a pathspec, even if it looks like an option
+    assert args['<pathspec>'] == ['docs', '--cache']
+    assert args['--cache'] is False
+
+
+def test_pathspecs_require_separator():
+    with pytest.raises(UsageError):
+        parse_usage('docs')
+
+
+def test_commands():
+    assert parse_usage('scrub', '--optimize')['scrub'] is True
+    assert parse_usage('serve', '--socket=/tmp/doctor.sock')['--socket'] == '/tmp/doctor.sock'
+
+
+def test_selected_usage():
+    args = parse_usage('--staged', '--max-size=500KB')
+
+    assert args['--staged'] is True
+    assert args['--max-size'] == '500KB'
+
+    # options of other usages are not allowed
+    with pytest.raises(UsageError):
+        parse_usage('--staged', '--cache')
+
+    with pytest.raises(UsageError):
+        parse_usage('scrub', '--budget=10')
+
+    with pytest.raises(UsageError):
+        parse_usage('--optimize')
+
+
+def test_exclusive_options():
+    with pytest.raises(UsageError):
+        parse_usage('scrub', '--aggressive', '--optimize')
+
+
+@pytest.mark.parametrize('argv', [
+    ['--unknown'],
+    ['--cache=yes'],
+    ['--budget'],
+    ['--budget=1', '--budget=2'],
+    ['scrub', 'serve']
+])
+def test_invalid_arguments(argv: list):
+    with pytest.raises(UsageError):
+        parse_usage(*argv)
@@ -0,0 +1,126 @@
+# coding=utf-8
+
+"""
+Tests for matching paths against gitignore-rules, compared against git itself.
+"""
+
+import os
+import posixpath
+import subprocess
+
+import pytest
+
+from doctor import ignore
+
+# rules of each .gitignore (by directory); chosen for the less obvious parts of the format
+RULES = {
+    '': ['# a comment',
+         '*.log',
+         '!keep.log',
+         '/anchored.txt',
+         'build/',
+         '!build/keep.o',
+         'doc/**/*.pdf',
+         '**/cache',
+         'a/**/z',
+         'everything/**',
+         '\\#hash',
+         '\\!bang',
+         'trailing\\ ',
+         'spaces   ',
+         '*.tmp',
+         '!important.tmp',
+         '[abc].dat',
+         '[!x]y.dat',
+         'file?.txt',
+         'nested/deep/',
+         'star*star'],
+    'sub': ['!*.log',
+            'local.txt',
+            '/only-here.txt',
+            'x/*.txt']
+}
+
+PATHS = [
+    'a.log', 'keep.log', 'sub/b.log', 'sub/keep.log', 'other/c.log',
+    'anchored.txt', 'sub/anchored.txt',
+    'build/out.o', 'build/keep.o', 'sub/build/out.o', 'building/out.o',
+    'doc/x.pdf', 'doc/a/b/x.pdf', 'other/doc/x.pdf',
+    'cache/f', 'x/y/cache/f', 'x/cache',
+    'a/z', 'a/b/c/z', 'b/a/z',
+    'everything/f', 'everything/a/b/f',
+    '#hash', '!bang', 'trailing ', 'trailing', 'spaces', 'spaces   ',
+    'x.tmp', 'important.tmp', 'sub/important.tmp',
+    'a.dat', 'd.dat', 'ay.dat', 'xy.dat',
+    'file1.txt', 'file12.txt', 'file.txt',
+    'nested/deep/f', 'nested/deep.txt',
+    'starstar', 'star-and-star', 'star/star',
+    'local.txt', 'sub/local.txt', 'sub/z/local.txt',
+    'only-here.txt', 'sub/only-here.txt', 'sub/z/only-here.txt',
+    'sub/x/f.txt', 'sub/x/y/f.txt'
+]
+
+
+@pytest.fixture
+def repository(tmp_path) -> str:
+    """ Return the path to a repository with the rules and paths of this test. """
+
+    path = str(tmp_path)
+
+    subprocess.run(['git', 'init', '--quiet', path], check=True)
+
+    for directory, rules in RULES.items():
+        os.makedirs(os.path.join(path, directory), exist_ok=True)
+
+        with open(os.path.join(path, directory, '.gitignore'), 'w') as file:
+            file.write('\n'.join(rules) + '\n')
+
+    for filepath in PATHS:
+        os.makedirs(os.path.join(path, os.path.dirname(filepath)), exist_ok=True)
+
+        with open(os.path.join(path, filepath), 'w'):
+            pass
+
+    return path
+
+
+def find_excluded_paths(paths: list, repo_path: str) -> set:
+    """ Return the set of paths that git considers excluded. """
+
+    # note that only the .gitignore files of the repository apply; not those of the user
+    env = dict(os.environ, GIT_CONFIG_NOSYSTEM='1', GIT_CONFIG_GLOBAL=os.devnull)
+
+    result = subprocess.run(['git', 'check-ignore', '--no-index', '--stdin', '-z'],
+                            cwd=repo_path, env=env,
+                            input='\0'.join(paths).encode('utf-8'),
+                            stdout=subprocess.PIPE)
+
+    return set(result.stdout.decode('utf-8').split('\0')[:-1])
+
+
+def test_matches_git(repository: str):
+    matcher = ignore.Matcher({directory: ignore.parse('\n'.join(rules),
+                                                      posixpath.join(directory, '.gitignore'))
+                              for directory, rules in RULES.items()})
+
+    excluded_paths = find_excluded_paths(PATHS, repository)
+
+    for path in PATHS:
+        assert matcher.is_excluded(path) == (path in excluded_paths), path
+
+
+def test_sources():
+    rules = ignore.parse('# a comment\n\n*.log\n!keep.log\n', 'sub/.gitignore')
+
+    assert [rule.source for rule in rules] == ['sub/.gitignore:3', 'sub/.gitignore:4']
+    assert [rule.glob for rule in rules] == ['*.log', 'keep.log']
+    assert [rule.is_negated for rule in rules] == [False, True]
+
+
+def test_explain():
+    matcher = ignore.Matcher({'': ignore.parse('build/\n*.o\n!keep.o\n', '.gitignore')})
+
+    # a file inside an excluded directory is attributed to the rule that excludes the directory
+    assert matcher.explain('build/keep.o').source == '.gitignore:1'
+    assert matcher.explain('src/main.o').source == '.gitignore:2'
+    assert matcher.explain('src/keep.o') is None
@@ -0,0 +1,55 @@
+# coding=utf-8
+
+"""
+Tests for resolving pathspecs relative to the root of a repository.
+"""
+
+import os
+import subprocess
+
+import pytest
+
+from doctor import repo
+
+
+@pytest.fixture
+def subdirectory(tmp_path) -> str:
+    """ Return the path to a subdirectory ('src') of a repository. """
+
+    subprocess.run(['git', 'init', '--quiet', str(tmp_path)], check=True)
+
+    path = tmp_path / 'src'
+    path.mkdir()
+
+    return str(path)
+
+
+@pytest.mark.parametrize('pathspec, resolved_pathspec', [
+    ('a.txt', 'src/a.txt'),
+    ('.', 'src'),
+    ('docs/', 'src/docs/'),
+    ('../README.md', 'README.md'),
+    (':!build', ':!src/build'),
+    (':(icase)*.TXT', ':(icase)src/*.TXT'),
+    (':(top)a.txt', ':(top)a.txt'),
+    (':/a.txt', ':/a.txt')
+])
+def test_relative_pathspecs(subdirectory: str, pathspec: str, resolved_pathspec: str):
+    assert repo.pathspecs_from_root([pathspec], repo_path=subdirectory) == [resolved_pathspec]
+
+
+def test_absolute_pathspecs(subdirectory: str):
+    root_path = os.path.dirname(subdirectory)
+
+    assert repo.pathspecs_from_root([subdirectory, os.path.join(subdirectory, 'docs') + '/',
+                                     os.path.join(root_path, 'README.md'),
+                                     f':(exclude){os.path.join(subdirectory, "build")}'],
+                                    repo_path=subdirectory) == [
+        'src', 'src/docs/', 'README.md', ':(exclude)src/build']
+
+
+def test_absolute_pathspecs_outside_work_tree(subdirectory: str, tmp_path):
+    outside_path = os.path.join(os.path.dirname(str(tmp_path)), 'elsewhere')
+
+    # left as is; for git to reject
+    assert repo.pathspecs_from_root([outside_path], repo_path=subdirectory) == [outside_path]
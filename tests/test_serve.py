@@ -0,0 +1,49 @@
+# coding=utf-8
+
+"""
+Tests for answering requests of the server.
+"""
+
+import pytest
+
+from doctor import serve
+
+
+@pytest.fixture
+def server():
+    server = serve.Server()
+
+    yield server
+
+    server.close()
+
+
+def test_invalid_request(server: serve.Server):
+    assert list(server.handle({'id': 1})) == [
+        {'id': 1, 'done': True, 'error': 'request must provide a path'}]
+
+
+def test_unexpected_error(server: serve.Server, monkeypatch):
+    def examine(request):
+        # e.g. an assertion about the output of git that does not hold
+        raise AssertionError()
+
+        yield
+
+    monkeypatch.setattr(server, 'examine', examine)
+
+    # any error is answered; the server keeps going
+    assert list(server.handle({'id': 2})) == [
+        {'id': 2, 'done': True, 'error': 'AssertionError'}]
+
+
+def test_session_eviction(server: serve.Server, monkeypatch):
+    monkeypatch.setattr(serve, 'SESSION_LIMIT', 1)
+
+    session = server.session('/a')
+
+    # an evicted session that is still in use does not hold up the next request
+    with session.lock:
+        server.session('/b')
+
+    assert list(server.sessions) == ['/b']
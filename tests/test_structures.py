@@ -0,0 +1,166 @@
+# coding=utf-8
+
+"""
+Tests for reading the commit-graphs, multi-pack-indexes and pack indexes that git writes.
+"""
+
+import os
+import glob
+import subprocess
+
+import pytest
+
+from doctor import structures
+
+GIT_ENVIRONMENT = {
+    'GIT_AUTHOR_NAME': 'test', 'GIT_AUTHOR_EMAIL': 'test@localhost',
+    'GIT_COMMITTER_NAME': 'test', 'GIT_COMMITTER_EMAIL': 'test@localhost',
+    'GIT_CONFIG_NOSYSTEM': '1', 'GIT_CONFIG_GLOBAL': os.devnull
+}
+
+# the number of commits in each batch; each batch is packed separately
+BATCH_SIZE = 50
+
+
+class Repository:
+    """ Represents a repository for testing; with a history of commits written in batches. """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.objects_path = os.path.join(path, '.git', 'objects')
+
+        self.git('init', '--quiet')
+
+    def git(self, *args) -> str:
+        result = subprocess.run(['git', *args], cwd=self.path,
+                                env=dict(os.environ, **GIT_ENVIRONMENT), check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        return result.stdout.decode('utf-8').strip()
+
+    def commit_batch(self) -> list:
+        """ Make a batch of commits and pack them; return the id of each commit. """
+
+        commit_ids = []
+
+        for _ in range(BATCH_SIZE):
+            self.git('commit', '--quiet', '--allow-empty', '--message', 'commit')
+
+            commit_ids.append(self.git('rev-parse', 'HEAD'))
+
+        # pack only the objects not already packed; i.e. a new pack for every batch
+        self.git('repack', '-d')
+
+        return commit_ids
+
+    def packs(self) -> list:
+        return sorted(os.path.basename(path) for path in
+                      glob.glob(os.path.join(self.objects_path, 'pack', '*.pack')))
+
+
+@pytest.fixture
+def repository(tmp_path) -> Repository:
+    return Repository(str(tmp_path))
+
+
+def test_commit_graph(repository: Repository):
+    assert structures.commit_graph_paths(repository.objects_path) == []
+
+    graphed_commits = repository.commit_batch()
+
+    repository.git('commit-graph', 'write', '--reachable')
+
+    ungraphed_commits = repository.commit_batch()
+
+    paths = structures.commit_graph_paths(repository.objects_path)
+
+    assert len(paths) == 1
+    assert structures.find_graphed_commits(paths, graphed_commits + ungraphed_commits) == set(
+        graphed_commits)
+
+
+def test_split_commit_graph(repository: Repository):
+    first_commits = repository.commit_batch()
+
+    repository.git('commit-graph', 'write', '--reachable', '--split=no-merge')
+
+    second_commits = repository.commit_batch()
+
+    repository.git('commit-graph', 'write', '--reachable', '--split=no-merge')
+
+    ungraphed_commits = repository.commit_batch()
+
+    paths = structures.commit_graph_paths(repository.objects_path)
+
+    # every layer of the chain is read
+    assert len(paths) == 2
+    assert structures.find_graphed_commits(
+        paths, first_commits + second_commits + ungraphed_commits) == set(
+        first_commits + second_commits)
+
+
+def test_not_a_commit_graph(tmp_path):
+    path = tmp_path / 'commit-graph'
+    path.write_bytes(b'MIDX' + bytes(64))
+
+    with pytest.raises(ValueError):
+        structures.find_graphed_commits([str(path)], ['0' * 40])
+
+
+def test_multi_pack_index(repository: Repository):
+    repository.commit_batch()
+    repository.commit_batch()
+
+    repository.git('multi-pack-index', 'write')
+
+    indexed_packs = repository.packs()
+
+    repository.commit_batch()
+
+    packs, checksum = structures.read_multi_pack_index(
+        structures.multi_pack_index_path(repository.objects_path))
+
+    assert sorted(packs) == indexed_packs
+    assert len(checksum) == 40
+
+    repository.git('multi-pack-index', 'write', '--bitmap')
+
+    packs, checksum = structures.read_multi_pack_index(
+        structures.multi_pack_index_path(repository.objects_path))
+
+    assert sorted(packs) == repository.packs()
+
+    # the checksum names the bitmap written along with the multi-pack-index
+    assert os.path.isfile(os.path.join(repository.objects_path, 'pack',
+                                       f'multi-pack-index-{checksum}.bitmap'))
+
+
+def test_pack_index(repository: Repository):
+    packed_commits = repository.commit_batch()
+
+    pack, = repository.packs()
+    path = os.path.join(repository.objects_path, 'pack', pack.replace('.pack', '.idx'))
+
+    # each commit has the same (empty) tree; so that is the only other object
+    assert structures.count_packed_objects(path) == len(packed_commits) + 1
+
+    repository.git('commit', '--quiet', '--allow-empty', '--message', 'loose')
+
+    loose_commit = repository.git('rev-parse', 'HEAD')
+
+    assert structures.find_packed_objects([path], packed_commits + [loose_commit]) == set(
+        packed_commits)
+
+
+def test_promisor_pack_index_paths(repository: Repository):
+    repository.commit_batch()
+    repository.commit_batch()
+
+    first_pack, _ = repository.packs()
+
+    pack_path = os.path.join(repository.objects_path, 'pack')
+
+    open(os.path.join(pack_path, first_pack.replace('.pack', '.promisor')), 'w').close()
+
+    assert structures.promisor_pack_index_paths(repository.objects_path) == [
+        os.path.join(pack_path, first_pack.replace('.pack', '.idx'))]